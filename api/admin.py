@@ -1,7 +1,70 @@
 # api/admin.py
 
+from django.conf import settings
 from django.contrib import admin
-from .models import Professor, Module, ModuleInstance, Rating
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Prefetch
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from .models import Professor, Module, ModuleInstance, Rating, ProfileCapture
+from .profiling import profile_summary
+
+
+def estimated_row_count(model, using):
+    """Approximate number of rows in model's table without scanning it, or None if no estimate is available"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        # 规划器统计（ANALYZE/autovacuum 维护）；从未分析过的表为 -1
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] >= 0 else None
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        # 自增主键的最大值只需读取主键索引的末端；删除过的行会使其偏大
+        return model._default_manager.using(using).aggregate(largest=Max('pk'))['largest'] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes the size of an unfiltered changelist from estimated_row_count() instead of COUNT(*).
+
+    Filtered and searched changelists, and tables below API_ADMIN_EXACT_COUNT_LIMIT rows, are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > settings.API_ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big to count or sort freely"""
+    paginator = EstimatedCountPaginator
+    # 不再为 "共 N 条" 额外执行一次未筛选的 COUNT(*)
+    show_full_result_count = False
+
+
+class StarsFilter(admin.SimpleListFilter):
+    """Fixed 1 to 5 star choices; the default filter would run SELECT DISTINCT rating over the whole table"""
+    title = 'rating'
+    parameter_name = 'rating'
+
+    def lookups(self, request, model_admin):
+        return [(str(stars), '*' * stars) for stars in range(1, 6)]
+
+    def queryset(self, request, queryset):
+        if self.value() in {str(stars) for stars in range(1, 6)}:
+            return queryset.filter(rating=int(self.value()))
+        return queryset
 
 
 @admin.register(Professor)
@@ -17,10 +80,19 @@ class ModuleAdmin(admin.ModelAdmin):
 
 
 @admin.register(ModuleInstance)
-class ModuleInstanceAdmin(admin.ModelAdmin):
+class ModuleInstanceAdmin(LargeTableAdmin):
     list_display = ('module', 'year', 'semester', 'get_professors')
     list_filter = ('year', 'semester')
     search_fields = ('module__code', 'module__name')
+    autocomplete_fields = ('module', 'professors')
+    # 与 unique_together 的索引顺序一致，翻页与自动补全都无需排序
+    ordering = ('module', 'year', 'semester')
+
+    def get_queryset(self, request):
+        # __str__ 需要 module；授课教授每页一次查询预取。自动补全接口也使用这个查询集
+        return super().get_queryset(request).select_related('module').prefetch_related(
+            Prefetch('professors', queryset=Professor.objects.order_by('name'))
+        )
 
     def get_professors(self, obj):
         return ", ".join([p.name for p in obj.professors.all()])
@@ -29,6 +101,62 @@ class ModuleInstanceAdmin(admin.ModelAdmin):
 
 
 @admin.register(Rating)
-class RatingAdmin(admin.ModelAdmin):
+class RatingAdmin(LargeTableAdmin):
     list_display = ('user', 'professor', 'module_instance', 'rating')
-    list_filter = ('rating',)
\ No newline at end of file
+    list_filter = (StarsFilter,)
+    list_select_related = ('user', 'professor', 'module_instance__module')
+    autocomplete_fields = ('user', 'professor', 'module_instance')
+    # 只按主键倒序翻页（rating 筛选走 rating_star_filter 索引），不允许按关联对象排序
+    sortable_by = ()
+
+
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    list_display = ('created', 'method', 'path', 'status', 'duration_ms', 'query_count', 'db_time_ms', 'user')
+    list_filter = ('method', 'status')
+    search_fields = ('path',)
+    date_hierarchy = 'created'
+    fields = ('created', 'method', 'path', 'status', 'duration_ms', 'query_count', 'db_time_ms', 'user',
+              'download', 'profile', 'sql')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                 name='api_profilecapture_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        # admin_view 只要求 is_staff；下载与查看详情页一样需要查看权限
+        capture = get_object_or_404(ProfileCapture, pk=pk)
+        if not self.has_view_permission(request, capture):
+            raise PermissionDenied
+        if not capture.profile_path().exists():
+            raise Http404('Profile file is missing')
+        return FileResponse(capture.profile_path().open('rb'), as_attachment=True,
+                            filename=capture.profile_path().name)
+
+    @admin.display(description='cProfile stats')
+    def download(self, obj):
+        return format_html('<a href="{}">{}</a> (open with pstats or snakeviz)',
+                           reverse('admin:api_profilecapture_download', args=[obj.pk]), obj.profile_path().name)
+
+    @admin.display(description='Top functions by cumulative time')
+    def profile(self, obj):
+        try:
+            return format_html('<pre>{}</pre>', profile_summary(obj))
+        except OSError:
+            return 'Profile file is missing'
+
+    @admin.display(description='Executed SQL')
+    def sql(self, obj):
+        try:
+            return format_html('<pre>{}</pre>', obj.sql_path().read_text(encoding='utf-8'))
+        except OSError:
+            return 'SQL file is missing'
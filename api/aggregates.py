@@ -0,0 +1,227 @@
+# api/aggregates.py
+
+from collections import Counter, defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from .cache import invalidate_all_professor_module_ratings, invalidate_professor_ratings
+from .models import (
+    STAR_FIELDS, Rating, ProfessorRatingAggregate, ProfessorModuleRatingAggregate,
+    ProfessorModuleInstanceRatingAggregate
+)
+
+COUNT_FIELDS = ('rating_sum', 'rating_count')
+HISTOGRAM_FIELDS = COUNT_FIELDS + STAR_FIELDS
+
+# 每张聚合表：(模型, 与 Rating 同名的分组字段, 维护的数值字段)
+AGGREGATE_TABLES = (
+    (ProfessorRatingAggregate, ('professor_id',), HISTOGRAM_FIELDS),
+    (ProfessorModuleRatingAggregate, ('professor_id', 'module_id'), COUNT_FIELDS),
+    (ProfessorModuleInstanceRatingAggregate, ('professor_id', 'module_instance_id'), HISTOGRAM_FIELDS),
+)
+
+# 从 Rating 原始行重新计算各数值字段的表达式
+_RECOMPUTE = dict(
+    rating_sum=Sum('rating'), rating_count=Count('rating'),
+    **{field: Count('rating', filter=Q(rating=stars)) for stars, field in enumerate(STAR_FIELDS, 1)},
+)
+
+
+def _change_delta(old_rating, new_rating, times=1):
+    """Field deltas of one rating change: sum and count, and the old star decremented and the new one incremented"""
+    delta = Counter({
+        'rating_sum': ((new_rating or 0) - (old_rating or 0)) * times,
+        'rating_count': ((new_rating is not None) - (old_rating is not None)) * times,
+    })
+    if old_rating is not None:
+        delta[STAR_FIELDS[old_rating - 1]] -= times
+    if new_rating is not None:
+        delta[STAR_FIELDS[new_rating - 1]] += times
+    return delta
+
+
+def apply_rating_changes(changes):
+    """Apply (professor_id, module_code, module_instance_id, old_rating, new_rating) changes to the aggregate tables.
+
+    old_rating is None for an insert and new_rating is None for a delete.
+    Must be called inside the transaction that writes the Rating rows.
+    """
+    _apply_changes((*change, 1) for change in changes)
+
+
+def remove_ratings(ratings):
+    """Subtract the ratings of a Rating queryset from the aggregate tables, read with one grouped query.
+
+    Used for deletes, so the work grows with the number of aggregate keys rather than of ratings.
+    Returns the affected (professor_id, module_code) pairs. Must be called inside the deleting transaction.
+    """
+    groups = list(ratings.order_by().values_list(
+        'professor_id', 'module_id', 'module_instance_id', 'rating'
+    ).annotate(times=Count('pk')))
+    _apply_changes(
+        (professor_id, module_code, module_instance_id, rating, None, times)
+        for professor_id, module_code, module_instance_id, rating, times in groups
+    )
+    return {(professor_id, module_code) for professor_id, module_code, _, _, _ in groups}
+
+
+def _apply_changes(changes):
+    """apply_rating_changes() for (..., old_rating, new_rating, times) tuples, each applied `times` times"""
+    professor_deltas = defaultdict(Counter)
+    module_deltas = defaultdict(Counter)
+    instance_deltas = defaultdict(Counter)
+
+    for professor_id, module_code, module_instance_id, old_rating, new_rating, times in changes:
+        delta = _change_delta(old_rating, new_rating, times)
+        professor_deltas[professor_id].update(delta)
+        module_deltas[(professor_id, module_code)].update(delta)
+        instance_deltas[(professor_id, module_instance_id)].update(delta)
+
+    for professor_id, delta in professor_deltas.items():
+        _apply_delta(ProfessorRatingAggregate, {'professor_id': professor_id}, _only(delta, HISTOGRAM_FIELDS))
+
+    for (professor_id, module_code), delta in module_deltas.items():
+        _apply_delta(ProfessorModuleRatingAggregate, {'professor_id': professor_id, 'module_id': module_code},
+                     _only(delta, COUNT_FIELDS))
+
+    # 批量评分通常分散在许多课程实例上，逐键 UPDATE 会让查询数随批量大小增长
+    _apply_deltas(ProfessorModuleInstanceRatingAggregate, ('professor_id', 'module_instance_id'),
+                  {key: _only(delta, HISTOGRAM_FIELDS) for key, delta in instance_deltas.items()})
+
+
+def lock_professor_aggregates(professor_ids):
+    """Lock the ProfessorRatingAggregate rows of professor_ids, creating empty ones first where needed.
+
+    Rating writes take these locks before reading the ratings they replace: a concurrent write for the same
+    professor then waits and reads the committed row, so a first rating inserted by both is counted once.
+    Must be called inside the transaction that writes the Rating rows.
+    """
+    professor_ids = sorted(set(professor_ids))
+    # 按主键顺序加锁，批量写入之间不会死锁
+    locked = ProfessorRatingAggregate.objects.select_for_update().filter(
+        professor_id__in=professor_ids
+    ).order_by('professor_id')
+    missing = set(professor_ids) - set(locked.values_list('professor_id', flat=True))
+    if not missing:
+        return
+    # 并发事务插入同一行时，这里等待其提交后忽略冲突，再锁定已提交的行
+    ProfessorRatingAggregate.objects.bulk_create(
+        [ProfessorRatingAggregate(professor_id=professor_id) for professor_id in sorted(missing)],
+        ignore_conflicts=True,
+    )
+    list(locked.filter(professor_id__in=missing).values_list('professor_id', flat=True))
+
+
+def _only(delta, fields):
+    """The non-zero entries of delta for the given fields"""
+    return {field: delta[field] for field in fields if delta[field]}
+
+
+def _apply_delta(model, lookup, delta):
+    if not delta:
+        return
+
+    queryset = model.objects.filter(**lookup)
+    increments = {field: F(field) + value for field, value in delta.items()}
+    if queryset.update(**increments):
+        return
+
+    # 删除时不要重新创建行（级联删除中教授或模块可能正在被删除）
+    if delta.get('rating_count', 0) <= 0:
+        return
+
+    _, created = model.objects.get_or_create(**lookup, defaults=delta)
+    if not created:
+        queryset.update(**increments)
+
+
+def _apply_deltas(model, key_fields, deltas):
+    """Apply {key: {field: delta}} to one aggregate table in a constant number of queries"""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    # 锁定已有行后按绝对值写回，避免并发写入互相覆盖
+    first, second = key_fields
+    candidates = model.objects.select_for_update().filter(**{
+        f'{first}__in': {key[0] for key in deltas}, f'{second}__in': {key[1] for key in deltas},
+    })
+    existing = {(getattr(row, first), getattr(row, second)): row for row in candidates}
+
+    updated, fields = [], set()
+    for key, row in existing.items():
+        if key in deltas:
+            for field, value in deltas[key].items():
+                setattr(row, field, getattr(row, field) + value)
+            fields.update(deltas[key])
+            updated.append(row)
+    if updated:
+        model.objects.bulk_update(updated, sorted(fields))
+
+    # 删除时不要重新创建行，与 _apply_delta 一致
+    created = [
+        model(**dict(zip(key_fields, key)), **delta)
+        for key, delta in deltas.items() if key not in existing and delta.get('rating_count', 0) > 0
+    ]
+    if not created:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(created)
+    except IntegrityError:
+        # 并发事务先插入了其中某些行：逐行回退
+        for key, delta in deltas.items():
+            if key not in existing and delta.get('rating_count', 0) > 0:
+                _apply_delta(model, dict(zip(key_fields, key)), delta)
+
+
+def _row_key(row, key_fields):
+    return row[key_fields[0]] if len(key_fields) == 1 else tuple(row[field] for field in key_fields)
+
+
+def expected_aggregates():
+    """Recompute the aggregate tables from the raw Rating rows, as one {key: {field: value}} dict per table"""
+    return tuple(
+        {
+            _row_key(row, key_fields): {field: row[field] for field in value_fields}
+            for row in Rating.objects.values(*key_fields).annotate(
+                **{field: _RECOMPUTE[field] for field in value_fields}
+            ).order_by()
+        }
+        for _, key_fields, value_fields in AGGREGATE_TABLES
+    )
+
+
+def find_aggregate_drift():
+    """Return a list of (table, key, stored, expected) tuples for rows that disagree with Rating.
+
+    stored and expected map each maintained field (sums, counts and star histograms) to its value.
+    """
+    drift = []
+    for (model, key_fields, value_fields), expected in zip(AGGREGATE_TABLES, expected_aggregates()):
+        stored = {
+            _row_key(row, key_fields): {field: row[field] for field in value_fields}
+            for row in model.objects.values(*key_fields, *value_fields)
+        }
+        empty = dict.fromkeys(value_fields, 0)
+        for key in sorted(stored.keys() | expected.keys()):
+            stored_value = stored.get(key, empty)
+            expected_value = expected.get(key, empty)
+            if stored_value != expected_value:
+                drift.append((model._meta.db_table, key, stored_value, expected_value))
+    return drift
+
+
+@transaction.atomic
+def rebuild_aggregates():
+    """Replace the aggregate tables with values recomputed from Rating; returns the row count of each table"""
+    counts = []
+    for (model, key_fields, _), expected in zip(AGGREGATE_TABLES, expected_aggregates()):
+        model.objects.all().delete()
+        model.objects.bulk_create(
+            model(**dict(zip(key_fields, key if len(key_fields) > 1 else (key,))), **values)
+            for key, values in expected.items()
+        )
+        counts.append(len(expected))
+    transaction.on_commit(invalidate_professor_ratings)
+    transaction.on_commit(invalidate_all_professor_module_ratings)
+    return tuple(counts)
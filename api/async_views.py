@@ -0,0 +1,128 @@
+# api/async_views.py
+#
+# 匿名只读接口的异步实现：在 ASGI 下由事件循环直接处理，不占用线程。
+# 查询、行序列化与缓存键均复用 views.py 中的同步实现，响应内容保持一致。
+
+import datetime
+from functools import wraps
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views import View
+from .cache import (
+    CATALOGUE_SCOPE, MODULE_LIST_KEY, PROFESSOR_RATINGS_KEY, RATINGS_SCOPE, acached, adata_version,
+    aprofessor_module_rating_key, version_page_key
+)
+from .pagination import InvalidPage, akeyset_page, is_paginated, is_streamed, ndjson_aresponse, page_request
+from .renderers import listing_format, render_listing
+from .views import ModuleListView, ProfessorModuleRatingView, ProfessorRatingsView
+
+
+def json_response(payload, status=200, request=None):
+    # 与 DRF 渲染器的输出保持一致；传入 request 时按 Accept 协商 table 等表示
+    body, content_type = render_listing(payload, listing_format(request) if request is not None else 'json')
+    return HttpResponse(body, status=status, content_type=content_type)
+
+
+def aconditional_on(scope):
+    """Async counterpart of views.conditional_on; the view receives the data version as a keyword"""
+    def decorator(method):
+        @wraps(method)
+        async def inner(self, request, *args, **kwargs):
+            version, modified = await adata_version(scope)
+            variant = listing_format(request)
+            etag = quote_etag(f'{scope}-{version}' if variant == 'json' else f'{scope}-{version}-{variant}')
+            last_modified = None
+            if modified:
+                if not timezone.is_aware(modified):
+                    modified = timezone.make_aware(modified, datetime.timezone.utc)
+                last_modified = int(modified.timestamp())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await method(self, request, *args, version=version, **kwargs)
+            if last_modified and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(last_modified)
+            response.headers.setdefault('ETag', etag)
+            patch_vary_headers(response, ('Accept',))
+            return response
+        return inner
+    return decorator
+
+
+class AsyncModuleListView(View):
+    http_method_names = ['get', 'head', 'options']
+
+    @aconditional_on(CATALOGUE_SCOPE)
+    async def get(self, request, version):
+        if is_streamed(request):
+            return ndjson_aresponse(ModuleListView.page_queryset(None), ModuleListView.module_instance_row)
+        if is_paginated(request):
+            try:
+                cursor, limit, after = page_request(request, ModuleListView.cursor_types)
+            except InvalidPage as e:
+                return json_response({'error': str(e)}, status=400, request=request)
+            result = await acached(
+                'module-list', version_page_key(MODULE_LIST_KEY, version, cursor, limit),
+                lambda: akeyset_page(ModuleListView.page_queryset(after), limit,
+                                     ModuleListView.module_instance_row, ModuleListView.module_instance_key)
+            )
+            return json_response(result, request=request)
+
+        result = await acached('module-list', MODULE_LIST_KEY, self.build_module_list)
+        return json_response(result, request=request)
+
+    @staticmethod
+    async def build_module_list():
+        return [
+            ModuleListView.module_instance_row(instance) async for instance in ModuleListView.module_instances()
+        ]
+
+
+class AsyncProfessorRatingsView(View):
+    http_method_names = ['get', 'head', 'options']
+
+    @aconditional_on(RATINGS_SCOPE)
+    async def get(self, request, version):
+        if is_streamed(request):
+            return ndjson_aresponse(ProfessorRatingsView.professors(), ProfessorRatingsView.professor_rating_row)
+        if is_paginated(request):
+            try:
+                cursor, limit, after = page_request(request, ProfessorRatingsView.cursor_types)
+            except InvalidPage as e:
+                return json_response({'error': str(e)}, status=400, request=request)
+            result = await acached(
+                'professor-ratings', version_page_key(PROFESSOR_RATINGS_KEY, version, cursor, limit),
+                lambda: akeyset_page(ProfessorRatingsView.page_queryset(after), limit,
+                                     ProfessorRatingsView.professor_rating_row, ProfessorRatingsView.professor_key)
+            )
+            return json_response(result, request=request)
+
+        result = await acached('professor-ratings', PROFESSOR_RATINGS_KEY, self.build_professor_ratings)
+        return json_response(result, request=request)
+
+    @staticmethod
+    async def build_professor_ratings():
+        return [
+            ProfessorRatingsView.professor_rating_row(professor)
+            async for professor in ProfessorRatingsView.professors()
+        ]
+
+
+class AsyncProfessorModuleRatingView(View):
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request, professor_id, module_code):
+        result = await acached(
+            'professor-module-rating',
+            await aprofessor_module_rating_key(professor_id, module_code),
+            lambda: self.build_professor_module_rating(professor_id, module_code)
+        )
+        if result is None:
+            return json_response({'error': 'Professor or module not found'}, status=404, request=request)
+        return json_response(result, request=request)
+
+    @staticmethod
+    async def build_professor_module_rating(professor_id, module_code):
+        row = await ProfessorModuleRatingView.rating_lookup(professor_id, module_code).afirst()
+        return ProfessorModuleRatingView.rating_payload(row)
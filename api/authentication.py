@@ -0,0 +1,14 @@
+# api/authentication.py
+
+from rest_framework.authentication import TokenAuthentication
+from .cache import cached_token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that resolves token keys through the token cache in api/cache.py.
+
+    Only active users are cached; signals drop a key when its token is deleted or its user is saved.
+    """
+
+    def authenticate_credentials(self, key):
+        return cached_token(key, super().authenticate_credentials)
@@ -0,0 +1,291 @@
+# api/cache.py
+
+import copy
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+from .models import DataVersion
+
+MODULE_LIST_KEY = 'api:module-list'
+PROFESSOR_RATINGS_KEY = 'api:professor-ratings'
+PROFESSOR_MODULE_GENERATION_KEY = 'api:professor-module-rating:generation'
+PROFESSOR_TOP_KEY = 'api:professor-top'
+PROFESSOR_HISTOGRAM_KEY = 'api:professor-histogram'
+
+# 数据版本范围：catalogue 覆盖 Professor/Module/ModuleInstance，ratings 覆盖 Rating 及教授名单
+CATALOGUE_SCOPE = 'catalogue'
+RATINGS_SCOPE = 'ratings'
+DATA_SCOPES = (CATALOGUE_SCOPE, RATINGS_SCOPE)
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+# 进程内的 token -> (user, token) LRU 缓存，条目在 API_TOKEN_CACHE_TTL 秒后过期
+_token_lock = threading.Lock()
+_token_cache = OrderedDict()
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def _record(name, outcome):
+    with _stats_lock:
+        _stats[name][outcome] += 1
+
+
+def cache_stats():
+    """Return per-endpoint hit/miss counters for this process"""
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def cached(name, key, build):
+    """Return the cached payload for key, building and storing it on a miss.
+
+    A build result of None is returned without being cached.
+    """
+    cache = get_cache()
+    payload = cache.get(key)
+    if payload is not None:
+        _record(name, 'hits')
+        return payload
+
+    _record(name, 'misses')
+    payload = build()
+    if payload is not None:
+        cache.set(key, payload, getattr(settings, 'API_CACHE_TIMEOUT', 300))
+    return payload
+
+
+async def acached(name, key, build):
+    """Async counterpart of cached(); build is a coroutine function"""
+    cache = get_cache()
+    payload = await cache.aget(key)
+    if payload is not None:
+        _record(name, 'hits')
+        return payload
+
+    _record(name, 'misses')
+    payload = await build()
+    if payload is not None:
+        await cache.aset(key, payload, getattr(settings, 'API_CACHE_TIMEOUT', 300))
+    return payload
+
+
+def _professor_module_generation(cache):
+    # 随机初始值：即使代数键被淘汰，也不会与旧键冲突
+    return cache.get_or_set(PROFESSOR_MODULE_GENERATION_KEY, random.getrandbits(32), None)
+
+
+def professor_module_rating_key(professor_id, module_code, generation=None):
+    if generation is None:
+        generation = _professor_module_generation(get_cache())
+    return f'api:professor-module-rating:{generation}:{professor_id}:{module_code}'
+
+
+async def aprofessor_module_rating_key(professor_id, module_code):
+    generation = await get_cache().aget_or_set(PROFESSOR_MODULE_GENERATION_KEY, random.getrandbits(32), None)
+    return professor_module_rating_key(professor_id, module_code, generation)
+
+
+def _version_keys(scope):
+    return f'api:data-version:{scope}', f'api:data-version:{scope}:modified'
+
+
+def _version_timeout():
+    # 版本号以数据库为准；缓存中的副本最多保留 API_CACHE_TIMEOUT 秒，
+    # 因此即使是进程内缓存，其他进程的写入也会在与响应缓存相同的时间内生效
+    return getattr(settings, 'API_CACHE_TIMEOUT', 300)
+
+
+def _version_defaults():
+    # 随机初始值：数据库重建后不会复用旧的 ETag
+    return {'version': random.getrandbits(48), 'modified': timezone.now()}
+
+
+def _version_values(rows):
+    values = {}
+    for row in rows:
+        version_key, modified_key = _version_keys(row.scope)
+        values[version_key] = row.version
+        values[modified_key] = row.modified.replace(microsecond=0)
+    return values
+
+
+def data_version(scope):
+    """Return (version, last_modified) for a data scope, reading every scope from the database on a cache miss"""
+    cache = get_cache()
+    version_key, modified_key = _version_keys(scope)
+    values = cache.get_many([version_key, modified_key])
+    if version_key in values and modified_key in values:
+        return values[version_key], values[modified_key]
+
+    rows = list(DataVersion.objects.filter(scope__in=DATA_SCOPES))
+    if scope not in {row.scope for row in rows}:
+        rows.append(DataVersion.objects.get_or_create(scope=scope, defaults=_version_defaults())[0])
+    values = _version_values(rows)
+    cache.set_many(values, _version_timeout())
+    return values[version_key], values[modified_key]
+
+
+async def adata_version(scope):
+    """Async counterpart of data_version()"""
+    cache = get_cache()
+    version_key, modified_key = _version_keys(scope)
+    values = await cache.aget_many([version_key, modified_key])
+    if version_key in values and modified_key in values:
+        return values[version_key], values[modified_key]
+
+    rows = [row async for row in DataVersion.objects.filter(scope__in=DATA_SCOPES)]
+    if scope not in {row.scope for row in rows}:
+        rows.append((await DataVersion.objects.aget_or_create(scope=scope, defaults=_version_defaults()))[0])
+    values = _version_values(rows)
+    await cache.aset_many(values, _version_timeout())
+    return values[version_key], values[modified_key]
+
+
+def bump_data_version(scope):
+    """Advance the version of a data scope in the database and drop this process's cached copy"""
+    now = timezone.now()
+    if not DataVersion.objects.filter(scope=scope).update(version=F('version') + 1, modified=now):
+        _, created = DataVersion.objects.get_or_create(scope=scope, defaults=_version_defaults())
+        if not created:
+            DataVersion.objects.filter(scope=scope).update(version=F('version') + 1, modified=now)
+    get_cache().delete_many(_version_keys(scope))
+
+
+def page_key(base_key, scope, cursor, limit):
+    """Key for one page of a listing; it embeds the data version so that writes retire every old page"""
+    return version_page_key(base_key, data_version(scope)[0], cursor, limit)
+
+
+def version_page_key(base_key, version, cursor, limit):
+    return f'{base_key}:page:{version}:{limit}:{cursor or ""}'
+
+
+def data_etag(*scopes, variant='json'):
+    """ETag of a listing built from the given scopes; representations other than JSON get their own tag"""
+    suffix = '' if variant == 'json' else f'-{variant}'
+    return '"' + '-'.join(f'{scope}-{data_version(scope)[0]}' for scope in scopes) + suffix + '"'
+
+
+def data_last_modified(*scopes):
+    modified = [data_version(scope)[1] for scope in scopes]
+    return max((value for value in modified if value is not None), default=None)
+
+
+def _query_key(base_key, params):
+    # 键中带上 ratings 与 catalogue 两个数据版本：任一变化都会让旧结果失效
+    versions = f'{data_version(RATINGS_SCOPE)[0]}:{data_version(CATALOGUE_SCOPE)[0]}'
+    query = ':'.join(f'{name}={"" if value is None else value}' for name, value in sorted(params.items()))
+    return f'{base_key}:{versions}:{query}'
+
+
+def professor_top_key(**params):
+    """Key for one leaderboard query"""
+    return _query_key(PROFESSOR_TOP_KEY, params)
+
+
+def professor_histogram_key(professor_id, **params):
+    """Key for the star histogram of one professor, possibly limited to some module instances"""
+    return _query_key(f'{PROFESSOR_HISTOGRAM_KEY}:{professor_id}', params)
+
+
+def invalidate_module_list():
+    get_cache().delete(MODULE_LIST_KEY)
+    bump_data_version(CATALOGUE_SCOPE)
+
+
+def invalidate_professor_ratings():
+    get_cache().delete(PROFESSOR_RATINGS_KEY)
+    bump_data_version(RATINGS_SCOPE)
+
+
+def invalidate_rating(professor_id, module_code):
+    """Drop every cached response that depends on ratings of professor_id in module_code"""
+    invalidate_ratings([(professor_id, module_code)])
+
+
+def invalidate_ratings(pairs):
+    """Drop the cached responses for several (professor_id, module_code) pairs at once"""
+    cache = get_cache()
+    generation = _professor_module_generation(cache)
+    keys = [PROFESSOR_RATINGS_KEY]
+    keys.extend(
+        professor_module_rating_key(professor_id, module_code, generation) for professor_id, module_code in pairs
+    )
+    cache.delete_many(keys)
+    bump_data_version(RATINGS_SCOPE)
+
+
+def invalidate_all_professor_module_ratings():
+    cache = get_cache()
+    try:
+        cache.incr(PROFESSOR_MODULE_GENERATION_KEY)
+    except ValueError:
+        _professor_module_generation(cache)
+
+
+def _token_key(key):
+    # 共享缓存中只保存 token 的摘要，不保存明文
+    return 'api:auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def cached_token(key, load):
+    """Return the (user, token) pair for a token key, calling load(key) only on a cache miss.
+
+    Entries live in an in-process LRU for API_TOKEN_CACHE_TTL seconds and, with API_TOKEN_CACHE_SHARED,
+    in the Django cache as well. Callers get copies, so per-request changes never leak into the cache.
+    """
+    now = time.monotonic()
+    with _token_lock:
+        entry = _token_cache.get(key)
+        if entry is not None and entry[0] > now:
+            _token_cache.move_to_end(key)
+            _record('auth-token', 'hits')
+            return copy.copy(entry[1]), copy.copy(entry[2])
+
+    ttl = getattr(settings, 'API_TOKEN_CACHE_TTL', 60)
+    shared = getattr(settings, 'API_TOKEN_CACHE_SHARED', False)
+    pair = get_cache().get(_token_key(key)) if shared else None
+    if pair is not None:
+        _record('auth-token', 'hits')
+    else:
+        _record('auth-token', 'misses')
+        pair = load(key)
+        if shared:
+            get_cache().set(_token_key(key), pair, ttl)
+
+    user, token = pair
+    with _token_lock:
+        _token_cache[key] = (now + ttl, user, token)
+        _token_cache.move_to_end(key)
+        while len(_token_cache) > getattr(settings, 'API_TOKEN_CACHE_SIZE', 10000):
+            _token_cache.popitem(last=False)
+    return copy.copy(user), copy.copy(token)
+
+
+def invalidate_tokens(keys):
+    keys = list(keys)
+    with _token_lock:
+        for key in keys:
+            _token_cache.pop(key, None)
+    if getattr(settings, 'API_TOKEN_CACHE_SHARED', False):
+        get_cache().delete_many([_token_key(key) for key in keys])
+
+
+def clear_token_cache():
+    with _token_lock:
+        _token_cache.clear()
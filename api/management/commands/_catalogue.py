@@ -0,0 +1,110 @@
+# api/management/commands/_catalogue.py
+#
+# import_catalogue / export_catalogue 共用的记录格式。每条记录一行，kind 为 professor、module 或 instance：
+#   professor: code = 教授 ID, name
+#   module:    code = 模块代码, name
+#   instance:  code = 模块代码, year, semester, professors = 授课教授 ID 列表
+# CSV 中 professors 以分号分隔；JSON 为每行一个对象（与 ?stream=ndjson 相同的换行分隔 JSON）。
+
+import csv
+import json
+import os
+import sys
+from django.core.management.base import CommandError
+from api.models import Module, Professor
+
+FORMATS = ('csv', 'json')
+KINDS = ('professor', 'module', 'instance')
+COLUMNS = ('kind', 'code', 'name', 'year', 'semester', 'professors')
+PROFESSOR_SEPARATOR = ';'
+CODE_MAX_LENGTH = min(Professor._meta.get_field('id').max_length, Module._meta.get_field('code').max_length)
+NAME_MAX_LENGTH = min(Professor._meta.get_field('name').max_length, Module._meta.get_field('name').max_length)
+
+
+def detect_format(path, requested):
+    """The --format value, or the one implied by the file extension (CSV for stdin and unknown extensions)"""
+    if requested:
+        return requested
+    extension = os.path.splitext(path)[1].lower()
+    return 'json' if extension in ('.json', '.jsonl', '.ndjson') else 'csv'
+
+
+def open_stream(path, mode):
+    """The file at path, or stdin/stdout for '-'"""
+    if path == '-':
+        return sys.stdin if mode == 'r' else sys.stdout
+    return open(path, mode, newline='', encoding='utf-8')
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _record(line, raw):
+    """Validate one raw record (a CSV row or a decoded JSON object) into a dict with typed values"""
+    kind = _text(raw.get('kind')).lower()
+    code = _text(raw.get('code'))
+    if kind not in KINDS:
+        raise CommandError(f'Line {line}: kind must be one of {", ".join(KINDS)}, not {kind!r}.')
+    if not code or len(code) > CODE_MAX_LENGTH:
+        raise CommandError(f'Line {line}: code is required and at most {CODE_MAX_LENGTH} characters long.')
+    if kind != 'instance':
+        name = _text(raw.get('name'))
+        if not name or len(name) > NAME_MAX_LENGTH:
+            raise CommandError(f'Line {line}: a {kind} needs a name of at most {NAME_MAX_LENGTH} characters.')
+        return {'kind': kind, 'code': code, 'name': name}
+
+    try:
+        year, semester = int(raw.get('year')), int(raw.get('semester'))
+    except (TypeError, ValueError):
+        raise CommandError(f'Line {line}: year and semester must be integers.')
+    if semester not in (1, 2):
+        raise CommandError(f'Line {line}: semester must be 1 or 2.')
+    professors = raw.get('professors') or []
+    if isinstance(professors, str):
+        professors = professors.split(PROFESSOR_SEPARATOR)
+    return {'kind': kind, 'code': code, 'year': year, 'semester': semester,
+            'professors': [professor for professor in map(_text, professors) if professor]}
+
+
+def read_records(stream, format_name):
+    """Yield (line number, record) for every record of a CSV or JSON lines stream"""
+    if format_name == 'csv':
+        reader = csv.DictReader(stream)
+        if reader.fieldnames is None or not {'kind', 'code'} <= set(reader.fieldnames):
+            raise CommandError('The CSV header must include at least the kind and code columns.')
+        for row in reader:
+            yield reader.line_num, _record(reader.line_num, row)
+        return
+
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            raw = json.loads(text)
+        except ValueError:
+            raise CommandError(f'Line {line}: not valid JSON.')
+        if not isinstance(raw, dict):
+            raise CommandError(f'Line {line}: expected a JSON object.')
+        yield line, _record(line, raw)
+
+
+class RecordWriter:
+    """Writes records in one of FORMATS"""
+
+    def __init__(self, stream, format_name):
+        self.stream = stream
+        self.format_name = format_name
+        if format_name == 'csv':
+            self.writer = csv.writer(stream)
+            self.writer.writerow(COLUMNS)
+
+    def write(self, record):
+        if self.format_name == 'csv':
+            professors = record.get('professors')
+            self.writer.writerow([
+                record['kind'], record['code'], record.get('name', ''), record.get('year', ''),
+                record.get('semester', ''), PROFESSOR_SEPARATOR.join(professors) if professors is not None else '',
+            ])
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
@@ -0,0 +1,22 @@
+# api/management/commands/_timing.py
+#
+# 基准测试命令共用的统计函数（以下划线开头，Django 不会将其注册为命令）
+
+import statistics
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(latencies, elapsed):
+    """Throughput and p50/p95/p99 latency (milliseconds) of one timed run"""
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'throughput': round(len(ordered) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(statistics.median(ordered) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+    }
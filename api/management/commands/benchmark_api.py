@@ -0,0 +1,321 @@
+# api/management/commands/benchmark_api.py
+
+import datetime
+import http.client
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from urllib.parse import urlencode
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import SimpleRateThrottle
+from api.models import Professor, Module, ModuleInstance, Rating
+from ._timing import summarize
+
+PASSWORD = 'benchmark'
+BULK_SIZE = 100
+# 压测时放开限流与写并发上限，测量的是接口本身而不是限流器
+UNLIMITED_RATES = {scope: '1000000/s' for scope in ('login', 'rate', 'rate-bulk')}
+SERVER_ENV = {
+    'API_THROTTLE_LOGIN': '1000000/s', 'API_THROTTLE_RATE': '1000000/s', 'API_THROTTLE_RATE_BULK': '1000000/s',
+    'API_MAX_CONCURRENT_WRITES': '1000', 'API_MAX_CONCURRENT_LOGINS': '1000',
+}
+
+
+class Workload:
+    """Builds the requests for every endpoint in api/urls.py from the rows already in the database"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.batches = itertools.count()
+        self.password_hash = make_password(PASSWORD)
+        self.teaching = list(
+            ModuleInstance.professors.through.objects
+            .values_list('professor_id', 'moduleinstance__module_id', 'moduleinstance__year',
+                         'moduleinstance__semester')[:5000]
+        )
+        if not self.teaching:
+            raise CommandError('No module instances with professors; run generate_dataset first.')
+        self.user = self.create_users('user', 1)[0]
+        self.admin = self.create_users('admin', 1, is_staff=True, is_superuser=True)[0]
+        self.user_token = Token.objects.create(user=self.user).key
+        self.admin_token = Token.objects.create(user=self.admin).key
+
+    def username(self, kind, index):
+        return f'bench-{self.run_id}-{kind}-{index}'
+
+    def create_users(self, kind, count, **fields):
+        users = User.objects.bulk_create(
+            User(username=self.username(kind, i), password=self.password_hash, **fields) for i in range(count)
+        )
+        if users and users[0].pk is None:
+            users = list(User.objects.filter(username__startswith=self.username(kind, '')).order_by('pk'))
+        return users
+
+    def cleanup(self):
+        User.objects.filter(username__startswith=f'bench-{self.run_id}-').delete()
+
+    def rating_item(self):
+        professor_id, module_code, year, semester = self.rng.choice(self.teaching)
+        return {'professor_id': professor_id, 'module_code': module_code, 'year': year, 'semester': semester,
+                'rating': self.rng.randint(1, 5)}
+
+    def endpoints(self):
+        """Endpoint name -> function building `count` (method, path, body, token) requests"""
+        def get(path, token=None):
+            return lambda count: [('GET', path, None, token)] * count
+
+        def register(count):
+            kind = f'register{next(self.batches)}'
+            return [('POST', reverse('register'),
+                     {'username': self.username(kind, i), 'email': 'bench@example.com', 'password': PASSWORD},
+                     None) for i in range(count)]
+
+        def logout(count):
+            # 每次注销删除一个令牌，因此为每个请求准备独立的用户与令牌
+            users = self.create_users(f'logout{next(self.batches)}', count)
+            tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in users)
+            return [('POST', reverse('logout'), None, token.key) for token in tokens]
+
+        def professor_module_rating(count):
+            return [('GET', reverse('professor-module-rating', args=self.rng.choice(self.teaching)[:2]), None, None)
+                    for _ in range(count)]
+
+        def professor_histogram(count):
+            return [('GET', reverse('professor-histogram', args=self.rng.choice(self.teaching)[:1]), None, None)
+                    for _ in range(count)]
+
+        return {
+            'register': register,
+            'login': lambda count: [('POST', reverse('login'),
+                                     {'username': self.user.username, 'password': PASSWORD}, None)] * count,
+            'logout': logout,
+            'module-list': get(reverse('module-list')),
+            'module-list-page': get(reverse('module-list') + '?limit=100'),
+            'professor-top': get(reverse('professor-top')),
+            'professor-top-filtered': lambda count: [
+                ('GET', reverse('professor-top') + '?' + urlencode({'year': self.rng.choice(self.teaching)[2]}),
+                 None, None) for _ in range(count)
+            ],
+            'professor-ratings': get(reverse('professor-ratings')),
+            'professor-ratings-page': get(reverse('professor-ratings') + '?limit=100'),
+            'professor-module-rating': professor_module_rating,
+            'professor-histogram': professor_histogram,
+            'rate': lambda count: [('POST', reverse('rate'), self.rating_item(), self.user_token)
+                                   for _ in range(count)],
+            'rate-bulk': lambda count: [('POST', reverse('rate-bulk'),
+                                         {'ratings': [self.rating_item() for _ in range(BULK_SIZE)]},
+                                         self.user_token) for _ in range(count)],
+            'cache-stats': get(reverse('cache-stats'), self.admin_token),
+        }
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every API endpoint through the Django test client (in-process, with queries per request) '
+            'and through a real local HTTP server, and store p50/p95/p99 latency and throughput as JSON so runs '
+            'on different commits can be compared. Run generate_dataset first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['client', 'server', 'both'], default='both')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight against the server.')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Endpoint to benchmark; repeatable. Defaults to all of them.')
+        parser.add_argument('--server-url',
+                            help='Benchmark an already running server (e.g. gunicorn or uvicorn) instead of '
+                                 'starting runserver. Its throttles should be lifted.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Result file; defaults to benchmarks/<commit>.json.')
+        parser.add_argument('--compare', help='Earlier result file to compare against.')
+
+    def handle(self, *args, **options):
+        workload = Workload(options['seed'])
+        results = {}
+        try:
+            endpoints = workload.endpoints()
+            names = options['endpoints'] or list(endpoints)
+            unknown = set(names) - set(endpoints)
+            if unknown:
+                raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}. "
+                                   f"Choose from: {', '.join(endpoints)}")
+            targets = ['client', 'server'] if options['target'] == 'both' else [options['target']]
+            for target in targets:
+                run = self.run_client if target == 'client' else self.run_server
+                results[target] = run({name: endpoints[name] for name in names}, options)
+        finally:
+            workload.cleanup()
+
+        commit, dirty = self.git_commit()
+        report = {
+            'commit': commit,
+            'dirty': dirty,
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'dataset': {model.__name__: model.objects.count()
+                        for model in (Professor, Module, ModuleInstance, User, Rating)},
+            'options': {key: options[key] for key in ('requests', 'concurrency', 'seed')},
+            'results': results,
+        }
+        output = options['output'] or os.path.join(settings.BASE_DIR, 'benchmarks', f'{commit or "unknown"}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(f'Results written to {output}')
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), report)
+
+    def run_client(self, endpoints, options):
+        client = Client(HTTP_HOST=self.host())
+        results = {}
+        with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', UNLIMITED_RATES):
+            for name, build in endpoints.items():
+                requests = build(options['requests'] + 1)
+                self.client_request(client, requests[0])  # 预热：填充缓存
+                latencies, statuses, queries = [], {}, 0
+                started = time.perf_counter()
+                for request in requests[1:]:
+                    with CaptureQueriesContext(connection) as context:
+                        began = time.perf_counter()
+                        status = self.client_request(client, request)
+                        latencies.append(time.perf_counter() - began)
+                    queries += len(context.captured_queries)
+                    statuses[status] = statuses.get(status, 0) + 1
+                elapsed = time.perf_counter() - started
+                results[name] = self.summary('client', name, latencies, elapsed, statuses,
+                                             queries / len(latencies))
+        return results
+
+    @staticmethod
+    def client_request(client, request):
+        method, path, body, token = request
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        if method == 'GET':
+            return client.get(path, **headers).status_code
+        return client.post(path, json.dumps(body) if body is not None else '', content_type='application/json',
+                           **headers).status_code
+
+    def run_server(self, endpoints, options):
+        process = None
+        if options['server_url']:
+            url = options['server_url'].rstrip('/')
+        else:
+            process, url = self.start_server()
+        try:
+            results = {}
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                for name, build in endpoints.items():
+                    requests = build(options['requests'] + 1)
+                    self.http_request(url, requests[0])
+                    started = time.perf_counter()
+                    timed = list(pool.map(lambda request: self.http_request(url, request), requests[1:]))
+                    elapsed = time.perf_counter() - started
+                    statuses = {}
+                    for status, _ in timed:
+                        statuses[status] = statuses.get(status, 0) + 1
+                    results[name] = self.summary('server', name, [latency for _, latency in timed], elapsed,
+                                                 statuses, None)
+            return results
+        finally:
+            if process:
+                process.terminate()
+                process.wait(timeout=10)
+
+    def start_server(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        process = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', f'127.0.0.1:{port}', '--noreload'],
+            env=dict(os.environ, **SERVER_ENV), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('runserver exited before accepting connections')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return process, f'http://127.0.0.1:{port}'
+            except OSError:
+                time.sleep(0.1)
+        process.terminate()
+        raise CommandError('runserver did not start within 30 seconds')
+
+    def http_request(self, url, request):
+        method, path, body, token = request
+        host, _, port = url.split('://', 1)[1].partition(':')
+        headers = {'Host': self.host(), 'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        conn = http.client.HTTPConnection(host, int(port or 80), timeout=60)
+        try:
+            started = time.perf_counter()
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status, time.perf_counter() - started
+        finally:
+            conn.close()
+
+    def summary(self, target, name, latencies, elapsed, statuses, queries):
+        result = summarize(latencies, elapsed)
+        result['errors'] = sum(count for status, count in statuses.items() if status >= 400)
+        result['statuses'] = {str(status): count for status, count in sorted(statuses.items())}
+        result['queries_per_request'] = round(queries, 2) if queries is not None else None
+        queries_text = f"{queries:6.1f} q/req" if queries is not None else ''
+        self.stdout.write(
+            f"{target:6} {name:24} {result['throughput']:9.1f} req/s  p50 {result['p50_ms']:8.2f} ms  "
+            f"p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+            f"errors {result['errors']:4}  {queries_text}"
+        )
+        return result
+
+    def compare(self, baseline, report):
+        self.stdout.write(f"Compared with {baseline.get('commit') or 'unknown'} (negative p50 change is faster):")
+        for target, results in report['results'].items():
+            for name, result in results.items():
+                before = baseline.get('results', {}).get(target, {}).get(name)
+                if not before:
+                    continue
+                self.stdout.write(
+                    f"{target:6} {name:24} p50 {self.change(before['p50_ms'], result['p50_ms'])}  "
+                    f"p99 {self.change(before['p99_ms'], result['p99_ms'])}  "
+                    f"throughput {self.change(before['throughput'], result['throughput'])}"
+                )
+
+    @staticmethod
+    def change(before, after):
+        if not before or after is None:
+            return '     n/a'
+        return f'{(after - before) / before * 100:+7.1f}%'
+
+    def host(self):
+        return settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+
+    @staticmethod
+    def git_commit():
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short=12', 'HEAD'], cwd=settings.BASE_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip()
+            dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                        cwd=settings.BASE_DIR, capture_output=True, text=True).stdout.strip())
+        except (OSError, subprocess.CalledProcessError):
+            return None, None
+        return commit, dirty
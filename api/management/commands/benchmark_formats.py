@@ -0,0 +1,60 @@
+# api/management/commands/benchmark_formats.py
+
+import gzip
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from api.middleware import brotli
+from api.renderers import FastJSONRenderer, MessagePackRenderer, TableRenderer, msgpack, orjson
+from api.views import ModuleListView, ProfessorRatingsView
+
+
+class Command(BaseCommand):
+    help = ('Compare the response formats of the listing endpoints on the configured database: serialization '
+            'time, body size, and size after gzip and brotli compression.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Renders per payload and format.')
+        parser.add_argument('--output', help='Also write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        payloads = {
+            'module-list': ModuleListView.build_module_list(),
+            'module-list-page': ModuleListView.build_module_page(None, 100),
+            'professor-ratings': ProfessorRatingsView.build_professor_ratings(),
+        }
+        renderers = {'json (DRF)': JSONRenderer()}
+        if orjson is not None:
+            renderers['json (orjson)'] = FastJSONRenderer()
+        renderers['table'] = TableRenderer()
+        if msgpack is not None:
+            renderers['msgpack'] = MessagePackRenderer()
+
+        results = {}
+        for payload_name, payload in payloads.items():
+            results[payload_name] = {}
+            for renderer_name, renderer in renderers.items():
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    body = renderer.render(payload)
+                elapsed = (time.perf_counter() - started) / options['repeat']
+                result = {
+                    'render_ms': round(elapsed * 1000, 3),
+                    'bytes': len(body),
+                    # 与压缩中间件使用相同的压缩级别
+                    'gzip_bytes': len(gzip.compress(body, compresslevel=6)),
+                    'brotli_bytes': (len(brotli.compress(body, quality=settings.API_BROTLI_QUALITY))
+                                     if brotli is not None else None),
+                }
+                results[payload_name][renderer_name] = result
+                self.stdout.write(
+                    f"{payload_name:18} {renderer_name:14} {result['render_ms']:9.3f} ms  "
+                    f"{result['bytes']:10} B  gzip {result['gzip_bytes']:9} B"
+                    + (f"  br {result['brotli_bytes']:9} B" if result['brotli_bytes'] is not None else '')
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
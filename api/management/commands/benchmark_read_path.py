@@ -0,0 +1,134 @@
+# api/management/commands/benchmark_read_path.py
+
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from ._timing import summarize
+
+DEFAULT_PATHS = ['module-list', 'professor-ratings']
+
+
+class Command(BaseCommand):
+    help = ('Compare read-endpoint throughput of the WSGI handler (sync views, thread pool) and the ASGI handler '
+            '(async views, one event loop) at a given concurrency, in-process against the configured database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight at once.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per path.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='URL path to request; repeatable. Defaults to the module and rating listings.')
+        parser.add_argument('--uncached', action='store_true',
+                            help='Disable the response cache so every request reaches the database.')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'both':
+            # 每种模式在独立进程中运行，使 URL 配置按 API_ASYNC_READS 重新加载
+            for mode in ('wsgi', 'asgi'):
+                self.run_child(mode, options)
+            return
+
+        paths = options['paths'] or [reverse(name) for name in DEFAULT_PATHS]
+        runner = self.run_wsgi if options['mode'] == 'wsgi' else self.run_asgi
+        for path in paths:
+            runner(path, 1, 1)  # 预热：建立连接并填充缓存
+            started = time.perf_counter()
+            latencies = runner(path, options['requests'], options['concurrency'])
+            elapsed = time.perf_counter() - started
+            self.report(options['mode'], path, latencies, elapsed)
+
+    def run_child(self, mode, options):
+        env = dict(os.environ, API_ASYNC_READS='1' if mode == 'asgi' else '0')
+        if options['uncached']:
+            env['API_CACHE_TIMEOUT'] = '0'
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_read_path', '--mode', mode,
+                   '--concurrency', str(options['concurrency']), '--requests', str(options['requests'])]
+        for path in options['paths'] or []:
+            command += ['--path', path]
+        if subprocess.call(command, env=env) != 0:
+            raise CommandError(f'{mode} benchmark failed')
+
+    def host(self):
+        return settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+
+    def run_wsgi(self, path, count, concurrency):
+        from django.core.wsgi import get_wsgi_application
+        application = get_wsgi_application()
+        path_info, _, query = path.partition('?')
+
+        def one(_):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path_info, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': self.host(), 'SERVER_PORT': '443', 'HTTP_HOST': self.host(),
+                'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'https', 'wsgi.input': io.BytesIO(),
+                'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False, 'wsgi.version': (1, 0),
+            }
+            statuses = []
+            started = time.perf_counter()
+            body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            for _ in body:
+                pass
+            body.close()
+            self.check_status(statuses[0])
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(one, range(count)))
+
+    def run_asgi(self, path, count, concurrency):
+        from django.core.asgi import get_asgi_application
+        application = get_asgi_application()
+        path_info, _, query = path.partition('?')
+
+        async def one(semaphore):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'https', 'path': path_info, 'raw_path': path_info.encode(), 'root_path': '',
+                'query_string': query.encode(), 'headers': [(b'host', self.host().encode())],
+                'server': (self.host(), 443), 'client': ('127.0.0.1', 0),
+            }
+            statuses = []
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # 与真实服务器一样，请求体之后一直等待到断开；Django 在响应完成后取消此等待
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await application(scope, receive, send)
+                self.check_status(statuses[0])
+                return time.perf_counter() - started
+
+        async def run():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(one(semaphore) for _ in range(count)))
+
+        return asyncio.run(run())
+
+    @staticmethod
+    def check_status(status):
+        code = int(str(status).split()[0])
+        if code != 200:
+            raise CommandError(f'Request failed with status {code}')
+
+    def report(self, mode, path, latencies, elapsed):
+        summary = summarize(latencies, elapsed)
+        self.stdout.write(
+            f"{mode:4} {path:32} {summary['throughput']:9.1f} req/s  p50 {summary['p50_ms']:7.2f} ms  "
+            f"p95 {summary['p95_ms']:7.2f} ms  p99 {summary['p99_ms']:7.2f} ms"
+        )
@@ -0,0 +1,61 @@
+# api/management/commands/export_catalogue.py
+
+import sys
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from api.models import Professor, Module, ModuleInstance
+from ._catalogue import FORMATS, RecordWriter, detect_format, open_stream
+
+CHUNK_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = ('Export every professor, module and module instance (with its professors) as CSV or JSON lines, in the '
+            'format read by import_catalogue. Rows are streamed from the database in chunks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='File to write (default: stdout).')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension, else csv.')
+        parser.add_argument('--progress-every', type=int, default=10000,
+                            help='Report progress on stderr after this many records (default 10000, 0 to turn off).')
+
+    def handle(self, *args, **options):
+        stream = open_stream(options['path'], 'w')
+        writer = RecordWriter(stream, detect_format(options['path'], options['format']))
+        progress_every = options['progress_every']
+        started = time.perf_counter()
+        count = 0
+        try:
+            for record in self.records():
+                writer.write(record)
+                count += 1
+                if progress_every and count % progress_every == 0:
+                    self.report(self.stderr.write, count, started)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        # 数据可能写到 stdout，统计信息一律写到 stderr
+        self.report(lambda message: self.stderr.write(self.style.SUCCESS(message)), count, started)
+
+    @staticmethod
+    def records():
+        """Professors, then modules, then module instances, so an import never meets a forward reference"""
+        for professor_id, name in Professor.objects.order_by('pk').values_list('pk', 'name').iterator(CHUNK_SIZE):
+            yield {'kind': 'professor', 'code': professor_id, 'name': name}
+        for code, name in Module.objects.order_by('pk').values_list('pk', 'name').iterator(CHUNK_SIZE):
+            yield {'kind': 'module', 'code': code, 'name': name}
+
+        # iterator(chunk_size) 按块预取授课教授：每块一次额外查询
+        instances = ModuleInstance.objects.order_by('module_id', 'year', 'semester').prefetch_related(
+            Prefetch('professors', queryset=Professor.objects.only('pk').order_by('pk'))
+        )
+        for instance in instances.iterator(CHUNK_SIZE):
+            professors = [professor.pk for professor in instance.professors.all()]
+            yield {'kind': 'instance', 'code': instance.module_id, 'year': instance.year,
+                   'semester': instance.semester, 'professors': professors}
+
+    @staticmethod
+    def report(write, count, started):
+        elapsed = time.perf_counter() - started
+        write(f'Exported {count} records in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f}/s).')
@@ -0,0 +1,116 @@
+# api/management/commands/generate_dataset.py
+
+import random
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from api.aggregates import rebuild_aggregates
+from api.cache import invalidate_all_professor_module_ratings, invalidate_module_list, invalidate_professor_ratings
+from api.models import Professor, Module, ModuleInstance, Rating
+
+BATCH_SIZE = 2000
+USER_PATTERN = r'^user[0-9]{6}$'
+MODULE_PATTERN = r'^M[0-9]{5}$'
+PROFESSOR_PATTERN = r'^P[0-9]{5}$'
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic catalogue (professors, modules, module instances, users and ratings) with bulk '
+            'inserts, for load testing. Generated rows use the prefixes P, M and user so they can be removed with '
+            '--clear.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--professors', type=int, default=200)
+        parser.add_argument('--modules', type=int, default=100)
+        parser.add_argument('--years', type=int, default=4, help='Academic years per module, ending this year.')
+        parser.add_argument('--professors-per-instance', type=int, default=2)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--ratings-per-user', type=int, default=20)
+        parser.add_argument('--password', default='benchmark', help='Password of every generated user.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, so runs are repeatable.')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated rows first.')
+
+    def handle(self, *args, **options):
+        if options['professors'] < options['professors_per_instance']:
+            raise CommandError('--professors must be at least --professors-per-instance.')
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            counts = self.generate(rng, options)
+            rebuild_aggregates()
+            transaction.on_commit(invalidate_module_list)
+            transaction.on_commit(invalidate_professor_ratings)
+            transaction.on_commit(invalidate_all_professor_module_ratings)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Generated {professors} professors, {modules} modules, {instances} module instances, '
+            '{users} users and {ratings} ratings.'.format(**counts)
+        ))
+
+    def clear(self):
+        # 先直接删除生成的评分，跳过按聚合键扣减：handle() 在生成后会整体重建一次聚合表
+        generated = (Q(user__username__regex=USER_PATTERN) | Q(module__code__regex=MODULE_PATTERN)
+                     | Q(professor__id__regex=PROFESSOR_PATTERN))
+        ratings = Rating.objects.filter(generated)
+        ratings._raw_delete(ratings.db)
+        User.objects.filter(username__regex=USER_PATTERN).delete()
+        Module.objects.filter(code__regex=MODULE_PATTERN).delete()
+        Professor.objects.filter(id__regex=PROFESSOR_PATTERN).delete()
+
+    def generate(self, rng, options):
+        professors = Professor.objects.bulk_create(
+            (Professor(id=f'P{i:05d}', name=f'Professor {i}') for i in range(options['professors'])),
+            batch_size=BATCH_SIZE
+        )
+        modules = Module.objects.bulk_create(
+            (Module(code=f'M{i:05d}', name=f'Module {i}') for i in range(options['modules'])),
+            batch_size=BATCH_SIZE
+        )
+
+        this_year = timezone.now().year
+        instances = ModuleInstance.objects.bulk_create(
+            (ModuleInstance(module=module, year=year, semester=semester)
+             for module in modules
+             for year in range(this_year - options['years'] + 1, this_year + 1)
+             for semester in (1, 2)),
+            batch_size=BATCH_SIZE
+        )
+
+        # 每个模块实例随机分配若干位教授
+        teaching = [
+            (instance, professor)
+            for instance in instances
+            for professor in rng.sample(professors, options['professors_per_instance'])
+        ]
+        Through = ModuleInstance.professors.through
+        Through.objects.bulk_create(
+            (Through(moduleinstance_id=instance.pk, professor_id=professor.pk) for instance, professor in teaching),
+            batch_size=BATCH_SIZE
+        )
+
+        # 所有用户共用同一个密码哈希，避免对每个用户都运行一次 PBKDF2
+        password = make_password(options['password'])
+        users = User.objects.bulk_create(
+            (User(username=f'user{i:06d}', email=f'user{i:06d}@example.com', password=password)
+             for i in range(options['users'])),
+            batch_size=BATCH_SIZE
+        )
+        if users and users[0].pk is None:
+            users = list(User.objects.filter(username__in=[user.username for user in users]))
+
+        per_user = min(options['ratings_per_user'], len(teaching))
+        ratings = Rating.objects.bulk_create(
+            (Rating(user=user, professor_id=professor.pk, module_instance_id=instance.pk,
+                    module_id=instance.module_id, rating=rng.randint(1, 5))
+             for user in users
+             for instance, professor in rng.sample(teaching, per_user)),
+            batch_size=BATCH_SIZE
+        )
+
+        return {'professors': len(professors), 'modules': len(modules), 'instances': len(instances),
+                'users': len(users), 'ratings': len(ratings)}
@@ -0,0 +1,163 @@
+# api/management/commands/import_catalogue.py
+
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from api.cache import invalidate_all_professor_module_ratings, invalidate_module_list, invalidate_professor_ratings
+from api.models import Professor, Module, ModuleInstance
+from ._catalogue import FORMATS, detect_format, open_stream, read_records
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Import professors, modules and module instances (with their professors) from a CSV or JSON lines file '
+            'written by export_catalogue. Existing professors and modules are updated, instances are matched by '
+            'module, year and semester, and teaching assignments are only ever added, so the import can be repeated '
+            'safely. Each batch is committed in its own transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or - for stdin.")
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension, else csv.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help=f'Records per kind written in one transaction (default {BATCH_SIZE}).')
+        parser.add_argument('--progress-every', type=int, default=10000,
+                            help='Report progress after this many records (default 10000, 0 to turn off).')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        self.batch_size = options['batch_size']
+        self.pending = {'professor': {}, 'module': {}, 'instance': {}}
+        self.counts = dict.fromkeys(
+            ('records', 'professors', 'new_professors', 'modules', 'new_modules', 'instances', 'new_instances',
+             'new_assignments'), 0
+        )
+        self.started = time.perf_counter()
+        progress_every = options['progress_every']
+
+        stream = open_stream(options['path'], 'r')
+        try:
+            for line, record in read_records(stream, detect_format(options['path'], options['format'])):
+                self.add(line, record)
+                self.counts['records'] += 1
+                if progress_every and self.counts['records'] % progress_every == 0:
+                    self.report(self.stdout.write)
+            self.flush_all()
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            # 之前批次已经提交：即使中途出错也要让缓存失效
+            if self.counts['professors'] or self.counts['modules'] or self.counts['instances']:
+                invalidate_module_list()
+                invalidate_professor_ratings()
+                invalidate_all_professor_module_ratings()
+
+        self.report(lambda message: self.stdout.write(self.style.SUCCESS(message)))
+
+    def add(self, line, record):
+        kind = record['kind']
+        pending = self.pending[kind]
+        if kind == 'instance':
+            # 同一实例出现多次时合并授课教授
+            key = (record['code'], record['year'], record['semester'])
+            pending.setdefault(key, (line, set()))[1].update(record['professors'])
+        else:
+            pending[record['code']] = record['name']
+        if len(pending) >= self.batch_size:
+            self.flush(kind)
+
+    def flush_all(self):
+        for kind in ('professor', 'module', 'instance'):
+            self.flush(kind)
+
+    def flush(self, kind):
+        if kind == 'instance':
+            # 实例引用的教授与模块必须先写入
+            self.flush('professor')
+            self.flush('module')
+        pending = self.pending[kind]
+        if not pending:
+            return
+        with transaction.atomic():
+            if kind == 'professor':
+                self.upsert_named(Professor, 'id', pending, 'professors')
+            elif kind == 'module':
+                self.upsert_named(Module, 'code', pending, 'modules')
+            else:
+                self.upsert_instances(pending)
+        pending.clear()
+
+    def upsert_named(self, model, key_field, names, counter):
+        """Insert or rename professors or modules in one INSERT ... ON CONFLICT DO UPDATE"""
+        existing = set(model.objects.filter(pk__in=list(names)).values_list('pk', flat=True))
+        model.objects.bulk_create(
+            [model(**{key_field: key, 'name': name}) for key, name in names.items()],
+            update_conflicts=True, unique_fields=[key_field], update_fields=['name'],
+        )
+        self.counts[counter] += len(names)
+        self.counts[f'new_{counter}'] += len(names) - len(existing)
+
+    def upsert_instances(self, pending):
+        """Create missing module instances and add missing professor assignments with a fixed number of queries"""
+        codes = {code for code, _, _ in pending}
+        professor_ids = set().union(*(professors for _, professors in pending.values()))
+        missing_modules = codes - set(Module.objects.filter(pk__in=codes).values_list('pk', flat=True))
+        missing_professors = professor_ids - set(
+            Professor.objects.filter(pk__in=professor_ids).values_list('pk', flat=True)
+        )
+        for key, (line, professors) in pending.items():
+            if key[0] in missing_modules:
+                raise CommandError(f'Line {line}: unknown module {key[0]}.')
+            unknown = sorted(professors & missing_professors)
+            if unknown:
+                raise CommandError(f'Line {line}: unknown professor(s) {", ".join(unknown)}.')
+
+        instance_ids = self.instance_ids(pending)
+        new = [key for key in pending if key not in instance_ids]
+        ModuleInstance.objects.bulk_create(
+            [ModuleInstance(module_id=code, year=year, semester=semester) for code, year, semester in new],
+            ignore_conflicts=True,
+        )
+        if new:
+            instance_ids.update(self.instance_ids(new))
+
+        Through = ModuleInstance.professors.through
+        assigned = set(Through.objects.filter(moduleinstance_id__in=instance_ids.values()).values_list(
+            'moduleinstance_id', 'professor_id'
+        ))
+        assignments = [
+            (instance_ids[key], professor_id)
+            for key, (_, professors) in pending.items()
+            for professor_id in sorted(professors)
+            if (instance_ids[key], professor_id) not in assigned
+        ]
+        Through.objects.bulk_create(
+            [Through(moduleinstance_id=instance_id, professor_id=professor_id)
+             for instance_id, professor_id in assignments],
+            ignore_conflicts=True,
+        )
+        self.counts['instances'] += len(pending)
+        self.counts['new_instances'] += len(new)
+        self.counts['new_assignments'] += len(assignments)
+
+    @staticmethod
+    def instance_ids(keys):
+        """{(module code, year, semester): pk} for the instances among keys that exist"""
+        keys = set(keys)
+        rows = ModuleInstance.objects.filter(
+            module_id__in={code for code, _, _ in keys}, year__in={year for _, year, _ in keys}
+        ).values_list('module_id', 'year', 'semester', 'pk')
+        return {(code, year, semester): pk for code, year, semester, pk in rows if (code, year, semester) in keys}
+
+    def report(self, write):
+        elapsed = time.perf_counter() - self.started
+        counts = self.counts
+        write(
+            f"{counts['records']} records in {elapsed:.1f}s ({counts['records'] / elapsed if elapsed else 0:.0f}/s): "
+            f"{counts['professors']} professors ({counts['new_professors']} new), "
+            f"{counts['modules']} modules ({counts['new_modules']} new), "
+            f"{counts['instances']} module instances ({counts['new_instances']} new), "
+            f"{counts['new_assignments']} new teaching assignments."
+        )
@@ -0,0 +1,34 @@
+# api/management/commands/rebuild_rating_aggregates.py
+
+from django.core.management.base import BaseCommand, CommandError
+from api.aggregates import find_aggregate_drift, rebuild_aggregates
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the materialized rating aggregates and star histograms from the Rating table, or check them '
+            'for drift.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report aggregate rows that disagree with Rating; exit non-zero on drift.'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = find_aggregate_drift()
+            for table, key, stored, expected in drift:
+                fields = [field for field in expected if stored[field] != expected[field]]
+                self.stdout.write(f"{table} {key}: " + ', '.join(
+                    f"{field} stored {stored[field]}, expected {expected[field]}" for field in fields
+                ))
+            if drift:
+                raise CommandError(f"{len(drift)} aggregate row(s) out of sync with Rating.")
+            self.stdout.write(self.style.SUCCESS('Rating aggregates are in sync.'))
+            return
+
+        professor_rows, module_rows, instance_rows = rebuild_aggregates()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {professor_rows} professor, {module_rows} professor/module and {instance_rows} "
+            f"professor/module instance aggregate rows."
+        ))
@@ -0,0 +1,155 @@
+# api/metrics.py
+#
+# 按视图统计请求耗时、数据库查询次数与耗时、响应大小，由 /metrics 以 Prometheus 文本格式导出。
+# 统计保存在进程内，多进程部署时需分别抓取每个进程。
+
+import contextvars
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from django.conf import settings
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = (
+    ('api_request_duration_seconds', 'Wall time spent handling the request.', DURATION_BUCKETS),
+    ('api_request_db_queries', 'Database queries executed per request.', QUERY_BUCKETS),
+    ('api_request_db_duration_seconds', 'Time spent in database queries per request.', DURATION_BUCKETS),
+    ('api_response_size_bytes', 'Response body size (streamed responses are not counted).', SIZE_BUCKETS),
+)
+
+UNMATCHED_VIEW = '<unmatched>'
+
+# 当前请求的数据库统计；sync_to_async 会把上下文复制到执行 ORM 的线程
+_request_stats = contextvars.ContextVar('api_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+def time_queries(execute, sql, params, many, context):
+    """Database execute wrapper that adds each query to the current request's RequestStats"""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def install_query_timer(sender=None, connection=None, **kwargs):
+    """Add time_queries to a connection's execute wrappers; also used as a connection_created receiver"""
+    if time_queries not in connection.execute_wrappers:
+        # 放在最前面：connection.execute_wrapper() 退出时弹出的是列表末尾的包装器
+        connection.execute_wrappers.insert(0, time_queries)
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _request_stats.set(stats)
+
+
+def end_request(token):
+    _request_stats.reset(token)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Per-process request counters and histograms, labelled by view name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._requests = {}
+            self._histograms = {}
+
+    def record(self, view, method, status, duration, queries, db_time, size):
+        values = (duration, queries, db_time, size)
+        with self._lock:
+            key = (view, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for (name, _, buckets), value in zip(HISTOGRAMS, values):
+                if value is None:
+                    continue
+                histogram = self._histograms.get((name, view))
+                if histogram is None:
+                    histogram = self._histograms[(name, view)] = Histogram(buckets)
+                histogram.observe(value)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = ['# HELP api_requests_total Requests handled, by view, method and status.',
+                 '# TYPE api_requests_total counter']
+        with self._lock:
+            for (view, method, status), count in sorted(self._requests.items()):
+                lines.append(f'api_requests_total{{view="{_escape(view)}",method="{method}",status="{status}"}} '
+                             f'{count}')
+            for name, description, _ in HISTOGRAMS:
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+                for (histogram_name, view), histogram in sorted(self._histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    label = f'view="{_escape(view)}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{label}}} {histogram.sum:g}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+def record_response(request, response, stats, duration):
+    """Record one finished request and add its Server-Timing header"""
+    match = request.resolver_match
+    view = (match.view_name or match.url_name or UNMATCHED_VIEW) if match else UNMATCHED_VIEW
+    size = None if response.streaming else len(response.content)
+    registry.record(view, request.method, response.status_code, duration, stats.queries, stats.db_time, size)
+    response.headers['Server-Timing'] = (
+        f'app;dur={duration * 1000:.2f}, db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"'
+    )
+
+
+def metrics_access_allowed(request):
+    """Scrapes are allowed from API_METRICS_ALLOWED_IPS or with 'Authorization: Bearer <API_METRICS_TOKEN>'"""
+    if request.META.get('REMOTE_ADDR') in settings.API_METRICS_ALLOWED_IPS:
+        return True
+    token = settings.API_METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
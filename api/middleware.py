@@ -0,0 +1,111 @@
+# api/middleware.py
+
+import re
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from .metrics import end_request, install_query_timer, record_response, start_request
+from .profiling import profile_request, should_profile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class RequestMetricsMiddleware:
+    """Records wall time, query count, query time, response size and status of every request.
+
+    Adds a Server-Timing header and feeds the histograms served at /metrics. Removed from the stack entirely
+    (MiddlewareNotUsed) unless settings.API_METRICS is on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # 之后新建的数据库连接（包括异步 ORM 所在线程的连接）都带上计时包装器
+        connection_created.connect(install_query_timer, dispatch_uid='api-metrics-query-timer')
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        install_query_timer(connection=connection)
+        stats, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        record_response(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        record_response(request, response, stats, time.perf_counter() - started)
+        return response
+
+
+class RequestProfilingMiddleware:
+    """Runs selected requests under cProfile and stores the capture (see api/profiling.py).
+
+    Synchronous only, since cProfile follows one thread; it is not loaded at all unless settings.API_PROFILING
+    is on, so it costs nothing by default.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if should_profile(request):
+            return profile_request(request, self.get_response)
+        return self.get_response(request)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Compresses responses to GET and HEAD with brotli when the client accepts it and the brotli package is
+    installed, and with gzip otherwise.
+
+    Other methods are left alone: login and registration responses carry tokens and echo user input, the mix
+    that compression side channels (BREACH) need.
+    """
+
+    def process_response(self, request, response):
+        if request.method not in ('GET', 'HEAD'):
+            return response
+        if (brotli is None or response.streaming or response.has_header('Content-Encoding')
+                or len(response.content) < 200
+                or not re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=settings.API_BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # 与 GZipMiddleware 一致：压缩后的实体不再逐字节相同，强 ETag 改为弱 ETag
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_aggregates(apps, schema_editor):
+    Rating = apps.get_model('api', 'Rating')
+    ProfessorRatingAggregate = apps.get_model('api', 'ProfessorRatingAggregate')
+    ProfessorModuleRatingAggregate = apps.get_model('api', 'ProfessorModuleRatingAggregate')
+
+    ProfessorRatingAggregate.objects.bulk_create(
+        ProfessorRatingAggregate(professor_id=row['professor_id'], rating_sum=row['rating_sum'],
+                                 rating_count=row['rating_count'])
+        for row in Rating.objects.values('professor_id').annotate(
+            rating_sum=Sum('rating'), rating_count=Count('id')
+        ).order_by()
+    )
+    ProfessorModuleRatingAggregate.objects.bulk_create(
+        ProfessorModuleRatingAggregate(professor_id=row['professor_id'], module_id=row['module_instance__module_id'],
+                                       rating_sum=row['rating_sum'], rating_count=row['rating_count'])
+        for row in Rating.objects.values('professor_id', 'module_instance__module_id').annotate(
+            rating_sum=Sum('rating'), rating_count=Count('id')
+        ).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfessorRatingAggregate',
+            fields=[
+                ('professor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_aggregate', serialize=False, to='api.professor')),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfessorModuleRatingAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.module')),
+                ('professor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.professor')),
+            ],
+            options={
+                'unique_together': {('professor', 'module')},
+            },
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
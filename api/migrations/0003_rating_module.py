@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_rating_module(apps, schema_editor):
+    Rating = apps.get_model('api', 'Rating')
+    ModuleInstance = apps.get_model('api', 'ModuleInstance')
+
+    Rating.objects.filter(module__isnull=True).update(module_id=Subquery(
+        ModuleInstance.objects.filter(pk=OuterRef('module_instance_id')).values('module_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rating',
+            name='module',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.module'),
+        ),
+        migrations.RunPython(backfill_rating_module, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_rating_module'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rating',
+            name='module',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='api.module'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['professor', 'module', 'rating'], name='rating_professor_module_cover'),
+        ),
+    ]
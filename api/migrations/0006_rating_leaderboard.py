@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:00
+
+import django.db.models.deletion
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_instance_aggregates(apps, schema_editor):
+    Rating = apps.get_model('api', 'Rating')
+    Aggregate = apps.get_model('api', 'ProfessorModuleInstanceRatingAggregate')
+
+    Aggregate.objects.bulk_create(
+        (Aggregate(professor_id=row['professor_id'], module_instance_id=row['module_instance_id'],
+                   rating_sum=row['rating_sum'], rating_count=row['rating_count'])
+         for row in Rating.objects.values('professor_id', 'module_instance_id').annotate(
+             rating_sum=Sum('rating'), rating_count=Count('rating')
+         ).order_by()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_profilecapture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfessorModuleInstanceRatingAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='professorratingaggregate',
+            name='average',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(rating_count=0, then=models.Value(0.0)), default=django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('rating_sum', models.FloatField()), '/', models.F('rating_count')), output_field=models.FloatField()), output_field=models.FloatField()),
+        ),
+        migrations.AddIndex(
+            model_name='professorratingaggregate',
+            index=models.Index(fields=['-average', '-rating_count', 'professor'], name='professor_aggregate_ranking'),
+        ),
+        migrations.AddField(
+            model_name='professormoduleinstanceratingaggregate',
+            name='module_instance',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.moduleinstance'),
+        ),
+        migrations.AddField(
+            model_name='professormoduleinstanceratingaggregate',
+            name='professor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.professor'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='professormoduleinstanceratingaggregate',
+            unique_together={('professor', 'module_instance')},
+        ),
+        migrations.RunPython(backfill_instance_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:08
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+STAR_FIELDS = [f'stars_{stars}' for stars in range(1, 6)]
+
+
+def backfill_histograms(apps, schema_editor):
+    Rating = apps.get_model('api', 'Rating')
+    for model_name, key_fields in (('ProfessorRatingAggregate', ('professor_id',)),
+                                   ('ProfessorModuleInstanceRatingAggregate', ('professor_id', 'module_instance_id'))):
+        Aggregate = apps.get_model('api', model_name)
+        histograms = {
+            tuple(row[field] for field in key_fields): row
+            for row in Rating.objects.values(*key_fields).annotate(**{
+                field: Count('rating', filter=Q(rating=stars)) for stars, field in enumerate(STAR_FIELDS, 1)
+            }).order_by()
+        }
+        aggregates = []
+        for aggregate in Aggregate.objects.all():
+            histogram = histograms.get(tuple(getattr(aggregate, field) for field in key_fields))
+            if histogram:
+                for field in STAR_FIELDS:
+                    setattr(aggregate, field, histogram[field])
+                aggregates.append(aggregate)
+        Aggregate.objects.bulk_update(aggregates, STAR_FIELDS, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_rating_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professormoduleinstanceratingaggregate',
+            name='stars_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professormoduleinstanceratingaggregate',
+            name='stars_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professormoduleinstanceratingaggregate',
+            name='stars_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professormoduleinstanceratingaggregate',
+            name='stars_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professormoduleinstanceratingaggregate',
+            name='stars_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professorratingaggregate',
+            name='stars_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professorratingaggregate',
+            name='stars_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professorratingaggregate',
+            name='stars_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professorratingaggregate',
+            name='stars_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professorratingaggregate',
+            name='stars_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_rating_histograms'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moduleinstance',
+            index=models.Index(fields=['year', 'semester'], name='moduleinstance_term_filter'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['rating', 'id'], name='rating_star_filter'),
+        ),
+    ]
@@ -1,6 +1,10 @@
 # models.py
 
-from django.db import models
+from pathlib import Path
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Cast
+from django.dispatch import Signal
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -29,19 +33,174 @@ class ModuleInstance(models.Model):
 
     class Meta:
         unique_together = ('module', 'year', 'semester')
+        indexes = [
+            models.Index(fields=['year', 'semester'], name='moduleinstance_term_filter'),
+        ]
 
     def __str__(self):
         return f"{self.module.code} {self.module.name} - {self.year} Semester {self.semester}"
 
 
+# 直接删除评分（Rating.delete() 或评分查询集的 delete()）之前发送，ratings 为将被删除的评分查询集。
+# Rating 不接收 pre_delete/post_delete：有接收者时 Django 无法在级联删除中批量删除评分，只能逐行加载
+ratings_deleting = Signal()
+
+
+class RatingQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create 不调用 save()，这里一次查询补齐冗余的 module 字段
+        objs = list(objs)
+        missing = {obj.module_instance_id for obj in objs if obj.module_id is None}
+        if missing:
+            modules = dict(ModuleInstance.objects.filter(pk__in=missing).values_list('pk', 'module_id'))
+            for obj in objs:
+                if obj.module_id is None:
+                    obj.module_id = modules.get(obj.module_instance_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            ratings_deleting.send(sender=self.model, ratings=self._chain())
+            return super().delete()
+
+
 class Rating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     professor = models.ForeignKey(Professor, on_delete=models.CASCADE)
     module_instance = models.ForeignKey(ModuleInstance, on_delete=models.CASCADE)
+    # 冗余自 module_instance.module，使按 (教授, 模块) 的聚合无需连接 ModuleInstance
+    module = models.ForeignKey(Module, on_delete=models.CASCADE, editable=False)
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
 
+    objects = RatingQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'professor', 'module_instance')
+        indexes = [
+            models.Index(fields=['professor', 'module', 'rating'], name='rating_professor_module_cover'),
+            # admin 按星级筛选并按主键倒序翻页
+            models.Index(fields=['rating', 'id'], name='rating_star_filter'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.module_instance_id is not None:
+            # 已加载的课程实例（如 admin 表单改了课程实例）直接取其模块，否则只在缺失时查询
+            if self._meta.get_field('module_instance').is_cached(self):
+                self.module_id = self.module_instance.module_id
+            elif self.module_id is None:
+                self.module_id = ModuleInstance.objects.values_list('module_id', flat=True).get(
+                    pk=self.module_instance_id
+                )
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=self._state.db):
+            ratings_deleting.send(sender=type(self), ratings=type(self).objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"Rating for {self.professor_id} in {self.module_instance} by {self.user.username}: {self.rating}"
+
+
+def _average(sum_field='rating_sum', count_field='rating_count'):
+    return models.Case(
+        models.When(**{count_field: 0}, then=models.Value(0.0)),
+        default=Cast(sum_field, models.FloatField()) / models.F(count_field),
+        output_field=models.FloatField(),
+    )
+
+
+# 每个星级一个计数列：histogram 表的行与 rating_sum/rating_count 在同一条 UPDATE 中维护
+STAR_FIELDS = tuple(f'stars_{stars}' for stars in range(1, 6))
+
+
+class RatingHistogram(models.Model):
+    """Number of 1 to 5 star ratings behind an aggregate row"""
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class ProfessorRatingAggregate(RatingHistogram):
+    professor = models.OneToOneField(Professor, primary_key=True, on_delete=models.CASCADE,
+                                     related_name='rating_aggregate')
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # 由数据库维护的精确平均分；排行榜按它的索引顺序读取前 N 名
+    average = models.GeneratedField(expression=_average(), output_field=models.FloatField(), db_persist=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-average', '-rating_count', 'professor'], name='professor_aggregate_ranking'),
+        ]
+
+    def __str__(self):
+        return f"Aggregate for {self.professor_id}: {self.rating_sum}/{self.rating_count}"
+
+
+class ProfessorModuleRatingAggregate(models.Model):
+    professor = models.ForeignKey(Professor, on_delete=models.CASCADE)
+    module = models.ForeignKey(Module, on_delete=models.CASCADE)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('professor', 'module')
+
+    def __str__(self):
+        return f"Aggregate for {self.professor_id} in {self.module_id}: {self.rating_sum}/{self.rating_count}"
+
+
+class ProfessorModuleInstanceRatingAggregate(RatingHistogram):
+    """Rating sum and count per professor and module instance, for rankings filtered by year, semester or module"""
+    professor = models.ForeignKey(Professor, on_delete=models.CASCADE)
+    module_instance = models.ForeignKey(ModuleInstance, on_delete=models.CASCADE)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('professor', 'module_instance')
+
+    def __str__(self):
+        return (f"Aggregate for {self.professor_id} in instance {self.module_instance_id}: "
+                f"{self.rating_sum}/{self.rating_count}")
+
+
+class ProfileCapture(models.Model):
+    """A profiled request; the cProfile stats and the executed SQL are files named after `name` in API_PROFILE_DIR"""
+    name = models.CharField(max_length=40, unique=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    db_time_ms = models.FloatField()
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        ordering = ['-created']
+
+    def profile_path(self):
+        return Path(settings.API_PROFILE_DIR) / f'{self.name}.prof'
+
+    def sql_path(self):
+        return Path(settings.API_PROFILE_DIR) / f'{self.name}.sql'
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class DataVersion(models.Model):
+    """Write counter of one cached data scope, shared by every process so that they all derive the same ETags"""
+    scope = models.CharField(max_length=20, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    modified = models.DateTimeField()
 
     def __str__(self):
-        return f"Rating for {self.professor.id} in {self.module_instance} by {self.user.username}: {self.rating}"
\ No newline at end of file
+        return f"{self.scope} v{self.version}"
@@ -0,0 +1,92 @@
+# api/pagination.py
+
+import base64
+import json
+from django.http import StreamingHttpResponse
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_CURSOR_LENGTH = 200
+STREAM_CHUNK_SIZE = 500
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types):
+    """Return the sort key stored in cursor, which must hold one value of each of the given types"""
+    if len(cursor) > MAX_CURSOR_LENGTH:
+        raise InvalidPage('Invalid cursor')
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidPage('Invalid cursor')
+    # bool 是 int 的子类，但从来不是合法的排序键
+    if not isinstance(values, list) or len(values) != len(types) or not all(
+        isinstance(value, kind) and not isinstance(value, bool) for value, kind in zip(values, types)
+    ):
+        raise InvalidPage('Invalid cursor')
+    return values
+
+
+def is_paginated(request):
+    return 'cursor' in request.GET or 'limit' in request.GET
+
+
+def is_streamed(request):
+    return request.GET.get('stream') in ('1', 'true', 'ndjson')
+
+
+def page_params(request):
+    """Return (cursor, limit) from the query string, raising InvalidPage on bad input"""
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidPage('Limit must be an integer')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidPage(f'Limit must be between 1 and {MAX_PAGE_SIZE}')
+    return request.GET.get('cursor') or None, limit
+
+
+def page_request(request, key_types):
+    """Return (cursor, limit, after) for a paginated request; after is the decoded sort key or None"""
+    cursor, limit = page_params(request)
+    return cursor, limit, decode_cursor(cursor, key_types) if cursor else None
+
+
+def keyset_page(queryset, limit, to_row, sort_key):
+    """Serialize one page of an ordered queryset that has already been filtered past the cursor.
+
+    One extra row is fetched to find out whether a next page exists.
+    """
+    rows = list(queryset[:limit + 1])
+    next_cursor = encode_cursor(sort_key(rows[limit - 1])) if len(rows) > limit else None
+    return {'results': [to_row(row) for row in rows[:limit]], 'next_cursor': next_cursor}
+
+
+def ndjson_response(queryset, to_row, chunk_size=STREAM_CHUNK_SIZE):
+    """Stream queryset as newline-delimited JSON, reading it from the database in chunks"""
+    lines = (json.dumps(to_row(row), separators=(',', ':')) + '\n' for row in queryset.iterator(chunk_size))
+    return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+
+async def akeyset_page(queryset, limit, to_row, sort_key):
+    """Async counterpart of keyset_page()"""
+    rows = [row async for row in queryset[:limit + 1]]
+    next_cursor = encode_cursor(sort_key(rows[limit - 1])) if len(rows) > limit else None
+    return {'results': [to_row(row) for row in rows[:limit]], 'next_cursor': next_cursor}
+
+
+def ndjson_aresponse(queryset, to_row, chunk_size=STREAM_CHUNK_SIZE):
+    """Async counterpart of ndjson_response(), for views served under ASGI"""
+    async def lines():
+        async for row in queryset.aiterator(chunk_size):
+            yield json.dumps(to_row(row), separators=(',', ':')) + '\n'
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
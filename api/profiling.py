@@ -0,0 +1,147 @@
+# api/profiling.py
+#
+# 按需剖析单个请求：在 cProfile 下运行视图，同时记录执行的 SQL，结果写入 API_PROFILE_DIR，
+# 并在 ProfileCapture 表中登记以便在 Django admin 中查看。
+
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from .authentication import CachedTokenAuthentication
+from .models import ProfileCapture
+
+# 同一时刻只能有一个 cProfile 处于启用状态；正在剖析时其他请求照常处理
+_profiler_lock = threading.Lock()
+
+
+def profile_dir():
+    return Path(settings.API_PROFILE_DIR)
+
+
+def _request_user(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    try:
+        result = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def should_profile(request):
+    """True for staff requests sending the API_PROFILE_HEADER header, or a API_PROFILE_SAMPLE_RATE sample.
+
+    The sample only includes staff requests unless API_PROFILE_SAMPLE_ALL_USERS is set.
+    """
+    if request.headers.get(settings.API_PROFILE_HEADER):
+        user = _request_user(request)
+        if user is not None and user.is_staff:
+            return True
+    if not (settings.API_PROFILE_SAMPLE_RATE > 0 and random.random() < settings.API_PROFILE_SAMPLE_RATE):
+        return False
+    if settings.API_PROFILE_SAMPLE_ALL_USERS:
+        return True
+    user = _request_user(request)
+    return user is not None and user.is_staff
+
+
+def _redacted(params, many):
+    # 参数可能包含 token、密码哈希等敏感值：只记录个数与类型
+    if params is None:
+        return 'none'
+    if many:
+        return f'{len(params)} rows'
+    if isinstance(params, dict):
+        return ', '.join(f'{name}: {type(value).__name__}' for name, value in params.items()) or 'none'
+    return ', '.join(type(value).__name__ for value in params) or 'none'
+
+
+class QueryRecorder:
+    """Execute wrapper that keeps the SQL, parameters and duration of every query; render() redacts the values"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, many, time.perf_counter() - started))
+
+    def render(self):
+        return ''.join(
+            f'-- #{number} {duration * 1000:.2f} ms{" (executemany)" if many else ""}\n'
+            f'-- params: {_redacted(params, many)}\n{sql};\n\n'
+            for number, (sql, params, many, duration) in enumerate(self.queries, 1)
+        )
+
+
+def profile_request(request, get_response):
+    """Run get_response under cProfile and store the capture; returns the response"""
+    if not _profiler_lock.acquire(blocking=False):
+        return get_response(request)
+    recorder = QueryRecorder()
+    profiler = cProfile.Profile()
+    try:
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+    finally:
+        _profiler_lock.release()
+
+    capture = save_capture(request, response, profiler, recorder, duration)
+    response.headers['X-Profile-Id'] = str(capture.pk)
+    return response
+
+
+def save_capture(request, response, profiler, recorder, duration):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f'{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+    profiler.dump_stats(directory / f'{name}.prof')
+    (directory / f'{name}.sql').write_text(recorder.render(), encoding='utf-8')
+
+    user = _request_user(request)
+    capture = ProfileCapture.objects.create(
+        name=name,
+        method=request.method,
+        path=request.get_full_path()[:ProfileCapture._meta.get_field('path').max_length],
+        status=response.status_code,
+        duration_ms=duration * 1000,
+        query_count=len(recorder.queries),
+        db_time_ms=sum(query[3] for query in recorder.queries) * 1000,
+        user_id=user.pk if user is not None else None,
+    )
+    prune_captures()
+    return capture
+
+
+def prune_captures():
+    """Keep only the newest API_PROFILE_KEEP captures, deleting older rows and their files"""
+    stale = list(ProfileCapture.objects.order_by('-created', '-pk')[settings.API_PROFILE_KEEP:])
+    for capture in stale:
+        capture.profile_path().unlink(missing_ok=True)
+        capture.sql_path().unlink(missing_ok=True)
+    ProfileCapture.objects.filter(pk__in=[capture.pk for capture in stale]).delete()
+
+
+def profile_summary(capture, limit=40):
+    """The top `limit` functions of a capture by cumulative time, as pstats prints them"""
+    stream = io.StringIO()
+    pstats.Stats(str(capture.profile_path()), stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
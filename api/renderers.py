@@ -0,0 +1,139 @@
+# api/renderers.py
+#
+# 响应格式：orjson 加速的 JSON（未安装 orjson 时退回 DRF 的 JSONRenderer）、按列存放的 "table"
+# 表示（列表接口不再为每行重复键名），以及安装了 msgpack 时可选的 MessagePack。
+
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.mediatypes import media_type_matches
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+JSON_MEDIA_TYPE = 'application/json'
+TABLE_MEDIA_TYPE = 'application/vnd.ratingservice.table+json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+# 列表接口可协商的表示（格式名 -> 媒体类型），第一个为默认
+LISTING_FORMATS = {'json': JSON_MEDIA_TYPE, 'table': TABLE_MEDIA_TYPE}
+if msgpack is not None:
+    LISTING_FORMATS['msgpack'] = MSGPACK_MEDIA_TYPE
+
+
+def render_json(data):
+    """Compact UTF-8 JSON, identical in content to DRF's JSONRenderer output"""
+    if orjson is None:
+        return JSONRenderer().render(data)
+    ret = orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_NON_STR_KEYS)
+    # 与 DRF 一致，转义 JavaScript 中不合法的 U+2028/U+2029
+    return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+def to_table(data):
+    """Turn a list of row dicts, or a page whose results are one, into {'count': n, 'columns': {name: [...]}}.
+
+    Anything else (single objects, errors) is returned unchanged.
+    """
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return dict(data, results=to_table(data['results']))
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        return data
+    names = list(data[0]) if data else []
+    return {'count': len(data), 'columns': {name: [row.get(name) for row in data] for name in names}}
+
+
+def parse_accept(header):
+    """Media ranges of an Accept header ordered by q-value (ties keep their order); q=0 ranges are dropped"""
+    ranges = []
+    for index, part in enumerate(header.split(',')):
+        media_type, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        media_type = media_type.strip().lower()
+        if media_type and quality > 0:
+            ranges.append((-quality, index, media_type))
+    return [media_type for _, _, media_type in sorted(ranges)]
+
+
+def listing_format(request):
+    """The LISTING_FORMATS entry a request asks for, from ?format= or the Accept header"""
+    requested = request.GET.get('format')
+    if requested in LISTING_FORMATS:
+        return requested
+    for accepted in parse_accept(request.headers.get('Accept') or '*/*'):
+        for name, media_type in LISTING_FORMATS.items():
+            if media_type_matches(media_type, accepted):
+                return name
+    return 'json'
+
+
+def render_listing(data, format_name):
+    """(body, content type) of data in one of LISTING_FORMATS, for views that bypass DRF's renderers"""
+    if format_name == 'table':
+        return render_json(to_table(data)), TABLE_MEDIA_TYPE
+    if format_name == 'msgpack':
+        return MessagePackRenderer().render(data), MSGPACK_MEDIA_TYPE
+    return render_json(data), JSON_MEDIA_TYPE
+
+
+class QualityContentNegotiation(DefaultContentNegotiation):
+    """DefaultContentNegotiation that honours q-values in the Accept header.
+
+    DRF only orders media ranges by specificity, so "table, application/json;q=0.9" would get JSON because the
+    JSON renderer is listed first.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query_param = self.settings.URL_FORMAT_OVERRIDE
+        if format_suffix or request.query_params.get(format_query_param):
+            return super().select_renderer(request, renderers, format_suffix)
+        for accepted in parse_accept(request.META.get('HTTP_ACCEPT') or '*/*'):
+            for renderer in renderers:
+                if media_type_matches(renderer.media_type, accepted):
+                    return renderer, renderer.media_type
+        return super().select_renderer(request, renderers, format_suffix)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that serializes with orjson when it is installed"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return render_json(data)
+
+
+class TableRenderer(FastJSONRenderer):
+    """Listings as column arrays instead of one dict per row (see to_table)"""
+    media_type = TABLE_MEDIA_TYPE
+    format = 'table'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_table(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack; only listed in DEFAULT_RENDERER_CLASSES when the msgpack package is installed"""
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
@@ -0,0 +1,137 @@
+# api/signals.py
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .aggregates import apply_rating_changes, remove_ratings
+from .cache import (
+    invalidate_all_professor_module_ratings, invalidate_module_list, invalidate_professor_ratings,
+    invalidate_rating, invalidate_ratings, invalidate_tokens
+)
+from .models import Professor, Module, ModuleInstance, Rating, ratings_deleting
+
+
+@receiver(pre_save, sender=Rating)
+def rating_saving(sender, instance, raw, **kwargs):
+    # 记录保存前的评分，post_save 据此计算聚合增量（视图以 bulk_create 写入，不经过这里）
+    instance._stored_rating = None
+    if instance.pk is not None:
+        instance._stored_rating = Rating.objects.filter(pk=instance.pk).values_list(
+            'professor_id', 'module_id', 'module_instance_id', 'rating'
+        ).first()
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_rating', None)
+    current = (instance.professor_id, instance.module_id, instance.module_instance_id)
+    if stored is None:
+        changes = [(*current, None, instance.rating)]
+    elif stored[:3] == current:
+        changes = [(*current, stored[3], instance.rating)]
+    else:
+        # 管理后台改了教授或课程实例：从旧分组移除，再加入新分组
+        changes = [(*stored[:3], stored[3], None), (*current, None, instance.rating)]
+    apply_rating_changes(changes)
+    transaction.on_commit(lambda: invalidate_rating(instance.professor_id, instance.module_id))
+    if stored is not None and stored[:2] != current[:2]:
+        transaction.on_commit(lambda: invalidate_rating(stored[0], stored[1]))
+
+
+def _remove_ratings(ratings):
+    pairs = remove_ratings(ratings)
+    if pairs:
+        transaction.on_commit(lambda: invalidate_ratings(pairs))
+
+
+@receiver(ratings_deleting, sender=Rating)
+def ratings_deleted(sender, ratings, **kwargs):
+    _remove_ratings(ratings)
+
+
+# 级联删除：在父对象删除前按聚合键分组扣减其评分，评分本身由 Django 直接批量删除。
+# 删除 Module 会级联到各个 ModuleInstance，由后者的 pre_delete 处理；
+# 删除 Professor 时其聚合行随之级联删除，无需扣减
+@receiver(pre_delete, sender=ModuleInstance)
+def module_instance_deleting(sender, instance, **kwargs):
+    _remove_ratings(Rating.objects.filter(module_instance=instance))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    _remove_ratings(Rating.objects.filter(user=instance))
+
+
+@receiver(post_save, sender=Professor)
+def professor_saved(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_module_list)
+    transaction.on_commit(invalidate_professor_ratings)
+
+
+@receiver(post_delete, sender=Professor)
+def professor_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_module_list)
+    transaction.on_commit(invalidate_professor_ratings)
+    transaction.on_commit(invalidate_all_professor_module_ratings)
+
+
+@receiver(post_save, sender=Module)
+def module_saved(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_module_list)
+
+
+@receiver(post_delete, sender=Module)
+def module_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_module_list)
+    transaction.on_commit(invalidate_all_professor_module_ratings)
+
+
+@receiver(post_save, sender=ModuleInstance)
+@receiver(post_delete, sender=ModuleInstance)
+def module_instance_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_module_list)
+
+
+@receiver(post_save, sender=ModuleInstance)
+def module_instance_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    # 模块实例被改到另一个模块时，同步 Rating 上的冗余 module 字段并移动聚合值
+    moved = list(Rating.objects.filter(module_instance=instance).exclude(module_id=instance.module_id).values_list(
+        'professor_id', 'module_id', 'rating'
+    ))
+    if not moved:
+        return
+    Rating.objects.filter(module_instance=instance).update(module_id=instance.module_id)
+    apply_rating_changes(
+        [(professor_id, module_code, instance.pk, rating, None) for professor_id, module_code, rating in moved]
+        + [(professor_id, instance.module_id, instance.pk, None, rating) for professor_id, _, rating in moved]
+    )
+    transaction.on_commit(invalidate_professor_ratings)
+    transaction.on_commit(invalidate_all_professor_module_ratings)
+
+
+@receiver(m2m_changed, sender=ModuleInstance.professors.through)
+def module_instance_professors_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(invalidate_module_list)
+
+
+def _drop_tokens(keys):
+    # 立即失效，并在提交后再失效一次，防止并发请求在提交前把旧数据重新写入缓存
+    invalidate_tokens(keys)
+    transaction.on_commit(lambda: invalidate_tokens(keys))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    _drop_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        # 停用、改密码等任何用户修改都会丢弃其缓存的 token
+        _drop_tokens(list(Token.objects.filter(user=instance).values_list('key', flat=True)))
@@ -1,3 +1,1377 @@
-from django.test import TestCase
+# api/tests.py
 
-# Create your tests here.
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Permission, User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+from . import views
+from .aggregates import apply_rating_changes, find_aggregate_drift, rebuild_aggregates
+from .async_views import AsyncModuleListView, AsyncProfessorModuleRatingView, AsyncProfessorRatingsView
+from .cache import CATALOGUE_SCOPE, cache_stats, clear_token_cache, get_cache, reset_cache_stats
+from .metrics import registry
+from .pagination import encode_cursor
+from .renderers import TABLE_MEDIA_TYPE, parse_accept, to_table
+from .models import (
+    STAR_FIELDS, Professor, Module, ModuleInstance, Rating, ProfessorRatingAggregate, ProfessorModuleRatingAggregate,
+    ProfessorModuleInstanceRatingAggregate, ProfileCapture, DataVersion
+)
+from .throttling import write_limiter
+from .urls import urlpatterns
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        clear_token_cache()
+        reset_cache_stats()
+        self.client = APIClient()
+
+
+class CatalogueTestCase(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.professor = Professor.objects.create(id='JE1', name='J. Excellent')
+        self.module = Module.objects.create(code='CD1', name='Computing for Dummies')
+        self.instance = ModuleInstance.objects.create(module=self.module, year=2018, semester=1)
+        self.instance.professors.add(self.professor)
+
+
+class ProfessorRatingsViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.other = User.objects.create_user(username='bob', password='secret')
+        self.module = Module.objects.create(code='CD1', name='Computing for Dummies')
+        self.instance = ModuleInstance.objects.create(module=self.module, year=2018, semester=1)
+
+    def seed_professors(self, count):
+        professors = Professor.objects.bulk_create(
+            Professor(id=f'P{i:04d}', name=f'Professor {i}') for i in range(count)
+        )
+        self.instance.professors.add(*professors)
+        Rating.objects.bulk_create(
+            Rating(user=user, professor=professor, module_instance=self.instance, rating=rating)
+            for professor in professors
+            for user, rating in ((self.user, 4), (self.other, 5))
+        )
+        # bulk_create 不发送 post_save 信号
+        rebuild_aggregates()
+
+    def test_average_is_rounded_per_professor(self):
+        self.seed_professors(2)
+        Professor.objects.create(id='ZZ9', name='Unrated')
+
+        response = self.client.get(reverse('professor-ratings'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'id': 'P0000', 'name': 'Professor 0', 'rating': round(4.5)},
+            {'id': 'P0001', 'name': 'Professor 1', 'rating': round(4.5)},
+            {'id': 'ZZ9', 'name': 'Unrated', 'rating': 0},
+        ])
+
+    def test_query_count_is_constant(self):
+        for count in (5, 500):
+            with self.captureOnCommitCallbacks(execute=True):
+                Professor.objects.all().delete()
+                self.seed_professors(count)
+            # 写入后先从数据库读取数据版本，再执行一次列表查询
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('professor-ratings'))
+            self.assertEqual(len(response.json()), count)
+
+
+class ModuleListViewTests(ApiTestCase):
+
+    def seed_instances(self, module_count, years):
+        modules = Module.objects.bulk_create(
+            Module(code=f'M{i:04d}', name=f'Module {i}') for i in range(module_count)
+        )
+        professors = Professor.objects.bulk_create(
+            Professor(id=f'P{i:02d}', name=f'Professor {i}') for i in range(10)
+        )
+        instances = ModuleInstance.objects.bulk_create(
+            ModuleInstance(module=module, year=year, semester=semester)
+            for module in modules
+            for year in years
+            for semester in (1, 2)
+        )
+        Through = ModuleInstance.professors.through
+        Through.objects.bulk_create(
+            Through(moduleinstance_id=instance.pk, professor_id=professors[n % 10].pk)
+            for n, instance in enumerate(instances)
+        )
+        return instances
+
+    def test_payload_shape(self):
+        self.seed_instances(1, [2018])
+
+        response = self.client.get(reverse('module-list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'code': 'M0000', 'name': 'Module 0', 'year': 2018, 'semester': 1,
+             'professors': [{'id': 'P00', 'name': 'Professor 0'}]},
+            {'code': 'M0000', 'name': 'Module 0', 'year': 2018, 'semester': 2,
+             'professors': [{'id': 'P01', 'name': 'Professor 1'}]},
+        ])
+
+    def test_query_count_is_constant(self):
+        instances = self.seed_instances(500, range(2015, 2019))
+        self.assertEqual(len(instances), 4000)
+
+        # 数据版本 + 模块实例 + 预取授课教授
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('module-list'))
+
+        self.assertEqual(len(response.json()), 4000)
+
+
+class RatingAggregateTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def rate(self, rating, **overrides):
+        data = {'professor_id': 'JE1', 'module_code': 'CD1', 'year': 2018, 'semester': 1, 'rating': rating}
+        data.update(overrides)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('rate'), data, format='json')
+
+    def stored(self):
+        professor = ProfessorRatingAggregate.objects.get(professor=self.professor)
+        module = ProfessorModuleRatingAggregate.objects.get(professor=self.professor, module=self.module)
+        return (professor.rating_sum, professor.rating_count), (module.rating_sum, module.rating_count)
+
+    def test_create_and_update_keep_aggregates_in_sync(self):
+        self.assertEqual(self.rate(2).status_code, 200)
+        self.assertEqual(self.stored(), ((2, 1), (2, 1)))
+
+        self.assertEqual(self.rate(5).status_code, 200)
+        self.assertEqual(self.stored(), ((5, 1), (5, 1)))
+
+        response = self.client.get(reverse('professor-module-rating', args=['JE1', 'CD1']))
+        self.assertEqual(response.json(), {'rating': 5, 'count': 1})
+
+    def test_invalid_rating_is_rejected(self):
+        self.assertEqual(self.rate(9).status_code, 400)
+        self.assertEqual(self.rate('x').status_code, 400)
+        self.assertFalse(ProfessorRatingAggregate.objects.exists())
+
+    def test_lookup_errors(self):
+        Professor.objects.create(id='VS1', name='V. Smart')
+        self.assertEqual(self.rate(3, professor_id='XX1').status_code, 404)
+        self.assertEqual(self.rate(3, module_code='XX1').status_code, 404)
+        self.assertEqual(self.rate(3, semester=2).status_code, 404)
+        self.assertEqual(self.rate(3, year='soon').status_code, 400)
+        response = self.rate(3, professor_id='VS1')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Professor does not teach this module instance')
+
+    def test_queries_per_rate(self):
+        # 1 校验查询 + 锁定教授聚合行 + 读取旧评分 + INSERT ... ON CONFLICT + 2 个聚合 UPDATE
+        # + 课程实例聚合的加锁读取与批量 UPDATE + 提交后递增数据版本，外加事务保存点
+        self.rate(2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.rate(3).status_code, 200)
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 9)
+        self.assertIn('ON CONFLICT', statements[3])
+        self.assertEqual(self.stored(), ((3, 1), (3, 1)))
+
+    def test_concurrent_first_rating_is_counted_once(self):
+        lock = views.lock_professor_aggregates
+
+        def rated_concurrently(professor_ids):
+            # 另一个请求在本请求拿到锁之前提交了同一用户的首次评分
+            Rating.objects.bulk_create([Rating(user=self.user, professor=self.professor,
+                                               module_instance=self.instance, module=self.module, rating=2)])
+            apply_rating_changes([('JE1', 'CD1', self.instance.pk, None, 2)])
+            lock(professor_ids)
+
+        with mock.patch.object(views, 'lock_professor_aggregates', side_effect=rated_concurrently):
+            self.assertEqual(self.rate(4).status_code, 200)
+
+        self.assertEqual(self.stored(), ((4, 1), (4, 1)))
+        self.assertEqual(find_aggregate_drift(), [])
+
+    def test_dry_run_validates_without_writing(self):
+        data = {'professor_id': 'JE1', 'module_code': 'CD1', 'year': 2018, 'semester': 1, 'rating': 4}
+        url = reverse('rate') + '?dry_run=1'
+
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.json(), {'success': True, 'dry_run': True})
+        self.assertEqual(self.client.post(url, dict(data, semester=2), format='json').status_code, 404)
+        self.assertFalse(Rating.objects.exists())
+        self.assertFalse(ProfessorRatingAggregate.objects.exists())
+
+    def test_direct_saves_keep_aggregates_in_sync(self):
+        self.rate(3)
+        other = User.objects.create_user(username='bob', password='secret')
+        rating = Rating.objects.create(user=other, professor=self.professor, module_instance=self.instance, rating=1)
+        self.assertEqual(self.stored(), ((4, 2), (4, 2)))
+
+        rating.rating = 5
+        rating.save()
+        self.assertEqual(self.stored(), ((8, 2), (8, 2)))
+
+        moved_to = ModuleInstance.objects.create(module=Module.objects.create(code='XX1', name='Moved'), year=2019,
+                                                 semester=2)
+        rating.module_instance = moved_to
+        rating.save()
+        self.assertEqual(Rating.objects.get(pk=rating.pk).module_id, 'XX1')
+        self.assertEqual(self.stored(), ((8, 2), (3, 1)))
+        self.assertEqual(find_aggregate_drift(), [])
+
+    def test_delete_and_cascade_decrement_aggregates(self):
+        self.rate(3)
+        other = User.objects.create_user(username='bob', password='secret')
+        Rating.objects.create(user=other, professor=self.professor, module_instance=self.instance, rating=1)
+
+        Rating.objects.get(user=other).delete()
+        self.assertEqual(self.stored(), ((3, 1), (3, 1)))
+
+        self.instance.delete()
+        self.assertEqual(self.stored(), ((0, 0), (0, 0)))
+
+        self.professor.delete()
+        self.assertFalse(ProfessorRatingAggregate.objects.exists())
+
+    def test_cascade_delete_queries_do_not_grow_with_ratings(self):
+        def delete_instance_with(count):
+            instance = ModuleInstance.objects.create(module=self.module, year=2000 + count, semester=1)
+            users = User.objects.bulk_create(User(username=f'user{count}-{i}') for i in range(count))
+            Rating.objects.bulk_create(
+                Rating(user=user, professor=self.professor, module_instance=instance, rating=1 + i % 5)
+                for i, user in enumerate(users)
+            )
+            rebuild_aggregates()
+            with CaptureQueriesContext(connection) as queries:
+                instance.delete()
+            self.assertEqual(find_aggregate_drift(), [])
+            return len(queries)
+
+        self.assertEqual(delete_instance_with(5), delete_instance_with(500))
+
+        # 删除用户：每个受影响的聚合键一组 UPDATE，与评分条数无关
+        ModuleInstance.objects.create(module=self.module, year=2019, semester=1).professors.add(self.professor)
+        self.rate(4)
+        self.rate(2, year=2019)
+        self.assertEqual(ProfessorRatingAggregate.objects.get().rating_count, 2)
+        self.user.delete()
+        self.assertEqual(find_aggregate_drift(), [])
+
+    def test_check_command_reports_drift_and_rebuild_fixes_it(self):
+        self.rate(4)
+        ProfessorRatingAggregate.objects.update(rating_sum=40)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rating_aggregates', '--check', stdout=StringIO())
+
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        out = StringIO()
+        call_command('rebuild_rating_aggregates', '--check', stdout=out)
+        self.assertIn('in sync', out.getvalue())
+        self.assertEqual(self.stored(), ((4, 1), (4, 1)))
+
+    def test_rating_module_is_denormalized_on_write(self):
+        other = User.objects.create_user(username='bob', password='secret')
+        self.rate(4)
+        Rating.objects.create(user=other, professor=self.professor, module_instance=self.instance, rating=2)
+        self.assertEqual(set(Rating.objects.values_list('module_id', flat=True)), {'CD1'})
+
+        moved_to = Module.objects.create(code='XX1', name='Moved')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.instance.module = moved_to
+            self.instance.save()
+        self.assertEqual(set(Rating.objects.values_list('module_id', flat=True)), {'XX1'})
+        self.assertEqual(find_aggregate_drift(), [])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'plan assertions use SQLite EXPLAIN QUERY PLAN output')
+class RatingIndexPlanTests(TestCase):
+    def assertCoveringIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'COVERING INDEX {index}', plan)
+        self.assertNotIn('api_moduleinstance', plan)
+
+    def test_rating_aggregates_are_index_only(self):
+        by_professor = Rating.objects.values('professor_id').annotate(
+            rating_sum=Sum('rating'), rating_count=Count('rating')
+        ).order_by()
+        by_module = Rating.objects.values('professor_id', 'module_id').annotate(
+            rating_sum=Sum('rating'), rating_count=Count('rating')
+        ).order_by()
+
+        self.assertCoveringIndex(by_professor, 'rating_professor_module_cover')
+        self.assertCoveringIndex(by_module, 'rating_professor_module_cover')
+        self.assertCoveringIndex(
+            Rating.objects.filter(professor_id='JE1', module_id='CD1').values('rating'),
+            'rating_professor_module_cover'
+        )
+
+    def test_professor_module_average_is_an_index_search(self):
+        plan = ProfessorModuleRatingAggregate.objects.filter(professor_id='JE1', module_id='CD1').explain()
+        self.assertIn('SEARCH', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_leaderboard_reads_the_ranking_index_in_order(self):
+        from .views import TopProfessorsView
+        plan = TopProfessorsView.overall_ranking(1)[:10].explain()
+        self.assertIn('professor_aggregate_ranking', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ResponseCacheTests(CatalogueTestCase):
+    def rate(self, rating):
+        self.client.force_authenticate(self.user)
+        data = {'professor_id': 'JE1', 'module_code': 'CD1', 'year': 2018, 'semester': 1, 'rating': rating}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('rate'), data, format='json')
+        self.client.force_authenticate(None)
+        return response
+
+    def test_repeated_reads_are_served_from_cache(self):
+        for name in ('module-list', 'professor-ratings'):
+            self.client.get(reverse(name))
+            with self.assertNumQueries(0):
+                self.client.get(reverse(name))
+
+        url = reverse('professor-module-rating', args=['JE1', 'CD1'])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        self.assertEqual(cache_stats()['module-list'], {'hits': 1, 'misses': 1})
+        self.assertEqual(cache_stats()['professor-module-rating'], {'hits': 1, 'misses': 1})
+
+    def test_rating_invalidates_rating_responses(self):
+        url = reverse('professor-module-rating', args=['JE1', 'CD1'])
+        self.assertEqual(self.client.get(url).json(), {'rating': 0, 'count': 0})
+        self.assertEqual(self.client.get(reverse('professor-ratings')).json()[0]['rating'], 0)
+
+        self.rate(4)
+
+        self.assertEqual(self.client.get(url).json(), {'rating': 4, 'count': 1})
+        self.assertEqual(self.client.get(reverse('professor-ratings')).json()[0]['rating'], 4)
+
+    def test_admin_changes_invalidate_module_list(self):
+        self.client.get(reverse('module-list'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.module.name = 'Renamed'
+            self.module.save()
+        self.assertEqual(self.client.get(reverse('module-list')).json()[0]['name'], 'Renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.instance.professors.clear()
+        self.assertEqual(self.client.get(reverse('module-list')).json()[0]['professors'], [])
+
+    def test_professor_module_rating_is_one_query(self):
+        self.rate(4)
+        for professor_id, module_code, expected in (
+            ('JE1', 'CD1', 200), ('XX1', 'CD1', 404), ('JE1', 'XX1', 404), ('XX1', 'XX1', 404)
+        ):
+            get_cache().clear()
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('professor-module-rating', args=[professor_id, module_code]))
+            self.assertEqual(response.status_code, expected)
+
+    def test_not_found_is_not_cached(self):
+        url = reverse('professor-module-rating', args=['XX1', 'CD1'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        Professor.objects.create(id='XX1', name='New')
+        self.assertEqual(self.client.get(url).json(), {'rating': 0, 'count': 0})
+
+    def test_module_delete_drops_professor_module_entries(self):
+        url = reverse('professor-module-rating', args=['JE1', 'CD1'])
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.module.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_stats_endpoint_requires_admin(self):
+        self.assertEqual(self.client.get(reverse('cache-stats')).status_code, 401)
+
+        admin = User.objects.create_superuser(username='root', password='secret')
+        self.client.force_authenticate(admin)
+        self.client.get(reverse('module-list'))
+        response = self.client.get(reverse('cache-stats'))
+        self.assertEqual(response.json()['module-list'], {'hits': 0, 'misses': 1})
+
+
+class ConditionalGetTests(CatalogueTestCase):
+    def test_unchanged_listing_answers_not_modified(self):
+        for name in ('module-list', 'professor-ratings'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Last-Modified', response)
+
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+
+    def test_versions_are_shared_through_the_database(self):
+        etag = self.client.get(reverse('module-list'))['ETag']
+        # 另一个进程：本地缓存里没有版本号，从数据库读到相同的 ETag
+        get_cache().clear()
+        self.assertEqual(self.client.get(reverse('module-list'))['ETag'], etag)
+
+        # 另一个进程的写入：缓存的版本号过期后生效
+        DataVersion.objects.filter(scope=CATALOGUE_SCOPE).update(version=F('version') + 1)
+        self.assertEqual(self.client.get(reverse('module-list'))['ETag'], etag)
+        get_cache().clear()
+        self.assertNotEqual(self.client.get(reverse('module-list'))['ETag'], etag)
+
+    def test_rating_changes_ratings_etag_only(self):
+        modules_etag = self.client.get(reverse('module-list'))['ETag']
+        ratings_etag = self.client.get(reverse('professor-ratings'))['ETag']
+
+        self.client.force_authenticate(self.user)
+        data = {'professor_id': 'JE1', 'module_code': 'CD1', 'year': 2018, 'semester': 1, 'rating': 3}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('rate'), data, format='json')
+
+        response = self.client.get(reverse('professor-ratings'), HTTP_IF_NONE_MATCH=ratings_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['rating'], 3)
+        response = self.client.get(reverse('module-list'), HTTP_IF_NONE_MATCH=modules_etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalogue_change_changes_modules_etag(self):
+        etag = self.client.get(reverse('module-list'))['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ModuleInstance.objects.create(module=self.module, year=2019, semester=2)
+
+        response = self.client.get(reverse('module-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+
+class BulkRateViewTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.other_professor = Professor.objects.create(id='VS1', name='V. Smart')
+
+    def post(self, ratings):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('rate-bulk'), {'ratings': ratings}, format='json')
+
+    def item(self, rating, professor_id='JE1', year=2018):
+        return {'professor_id': professor_id, 'module_code': 'CD1', 'year': year, 'semester': 1, 'rating': rating}
+
+    def test_reports_per_item_results(self):
+        response = self.post([
+            self.item(4),
+            self.item(9),
+            self.item(3, professor_id='VS1'),
+            self.item(3, year=2030),
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['created'], body['updated'], body['failed']), (1, 0, 3))
+        self.assertEqual([result['success'] for result in body['results']], [True, False, False, False])
+        self.assertEqual(body['results'][2]['error'], 'Professor does not teach this module instance')
+        self.assertEqual(body['results'][3]['error'], 'Professor, module or module instance not found')
+
+    def test_upsert_updates_existing_rating_and_aggregates(self):
+        self.post([self.item(2)])
+        body = self.post([self.item(1), self.item(5)]).json()
+
+        self.assertEqual((body['created'], body['updated']), (0, 1))
+        self.assertTrue(body['results'][0]['superseded'])
+        self.assertEqual(Rating.objects.get().rating, 5)
+        aggregate = ProfessorRatingAggregate.objects.get(professor=self.professor)
+        self.assertEqual((aggregate.rating_sum, aggregate.rating_count), (5, 1))
+        self.assertEqual(
+            self.client.get(reverse('professor-module-rating', args=['JE1', 'CD1'])).json(), {'rating': 5, 'count': 1}
+        )
+
+    def test_concurrent_first_ratings_are_counted_once(self):
+        lock = views.lock_professor_aggregates
+
+        def rated_concurrently(professor_ids):
+            # 另一个批量请求在本请求拿到锁之前提交了同一条评分
+            Rating.objects.bulk_create([Rating(user=self.user, professor=self.professor,
+                                               module_instance=self.instance, module=self.module, rating=2)])
+            apply_rating_changes([('JE1', 'CD1', self.instance.pk, None, 2)])
+            lock(professor_ids)
+
+        with mock.patch.object(views, 'lock_professor_aggregates', side_effect=rated_concurrently):
+            body = self.post([self.item(4)]).json()
+
+        self.assertEqual((body['created'], body['updated']), (0, 1))
+        aggregate = ProfessorRatingAggregate.objects.get(professor=self.professor)
+        self.assertEqual((aggregate.rating_sum, aggregate.rating_count), (4, 1))
+        self.assertEqual(find_aggregate_drift(), [])
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        instances = ModuleInstance.objects.bulk_create(
+            ModuleInstance(module=self.module, year=year, semester=semester)
+            for year in range(1900, 1990) for semester in (1, 2)
+        )
+        self.professor.moduleinstance_set.add(*instances)
+        batch = [
+            {'professor_id': 'JE1', 'module_code': 'CD1', 'year': instance.year, 'semester': instance.semester,
+             'rating': 3}
+            for instance in instances
+        ]
+
+        with CaptureQueriesContext(connection) as single:
+            self.post(batch[:1])
+        # 回到空的聚合表，使两次请求都走新建聚合行的路径
+        Rating.objects.all().delete()
+        for model in (ProfessorRatingAggregate, ProfessorModuleRatingAggregate, ProfessorModuleInstanceRatingAggregate):
+            model.objects.all().delete()
+        with CaptureQueriesContext(connection) as full:
+            response = self.post(batch)
+
+        # 新建的课程实例聚合行按数据库的参数上限分批 INSERT（SQLite 为 999 个参数，即两批）
+        fields = [field for field in ProfessorModuleInstanceRatingAggregate._meta.concrete_fields
+                  if not field.primary_key]
+        inserts = -(-180 // connection.ops.bulk_batch_size(fields, [None] * 180))
+        self.assertEqual(len(full), len(single) + inserts - 1)
+        self.assertEqual(response.json()['created'], 180)
+        self.assertEqual(ProfessorRatingAggregate.objects.get().rating_count, 180)
+
+    def test_rejects_malformed_body(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.post([self.item(3)]).status_code, 401)
+
+
+class PaginatedListingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        modules = Module.objects.bulk_create(Module(code=f'M{i:02d}', name=f'Module {i}') for i in range(3))
+        self.professors = Professor.objects.bulk_create(
+            Professor(id=f'P{i:02d}', name=f'Professor {i}') for i in range(5)
+        )
+        for module in modules:
+            for semester in (1, 2):
+                instance = ModuleInstance.objects.create(module=module, year=2018, semester=semester)
+                instance.professors.add(*self.professors[:2])
+
+    def collect(self, name, limit):
+        items, cursor, pages = [], None, 0
+        while True:
+            params = {'limit': limit}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(reverse(name), params)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertLessEqual(len(body['results']), limit)
+            items.extend(body['results'])
+            pages += 1
+            cursor = body['next_cursor']
+            if cursor is None:
+                return items, pages
+
+    def test_pages_cover_the_full_listing_in_order(self):
+        for name, limit, expected_pages in (('module-list', 4, 2), ('professor-ratings', 2, 3)):
+            full = self.client.get(reverse(name)).json()
+            items, pages = self.collect(name, limit)
+            self.assertEqual(items, full)
+            self.assertEqual(pages, expected_pages)
+
+    def test_page_query_count_is_constant(self):
+        # 第一次请求还会读取数据版本，之后它们留在缓存中
+        with self.assertNumQueries(3):
+            self.client.get(reverse('module-list'), {'limit': 4})
+        with self.assertNumQueries(1):
+            self.client.get(reverse('professor-ratings'), {'limit': 2})
+
+    def test_pages_follow_writes(self):
+        self.client.get(reverse('professor-ratings'), {'limit': 10})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Professor.objects.create(id='P99', name='Newcomer')
+
+        ids = [row['id'] for row in self.client.get(reverse('professor-ratings'), {'limit': 10}).json()['results']]
+        self.assertEqual(ids[-1], 'P99')
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'limit': 0}, {'limit': 'x'}, {'cursor': 'not-a-cursor'}, {'cursor': 'WzFd'}):
+            self.assertEqual(self.client.get(reverse('module-list'), params).status_code, 400)
+
+    def test_wrongly_typed_cursor_is_rejected(self):
+        for name, key in (('module-list', ['CD1', 'abc', 1]), ('module-list', ['CD1', True, 1]),
+                          ('module-list', [1, 2018, 1]), ('professor-ratings', [5])):
+            response = self.client.get(reverse(name), {'cursor': encode_cursor(key)})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'Invalid cursor'})
+
+    def test_stream_returns_ndjson(self):
+        for name in ('module-list', 'professor-ratings'):
+            response = self.client.get(reverse(name), {'stream': '1'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+            self.assertEqual([json.loads(line) for line in lines], self.client.get(reverse(name)).json())
+
+
+class AsyncReadViewTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+        Rating.objects.create(user=self.user, professor=self.professor, module_instance=self.instance, rating=4)
+
+    async def call(self, view, path, headers=None, **kwargs):
+        request = self.factory.get(path, headers=headers)
+        return await view.as_view()(request, **kwargs)
+
+    async def test_payloads_match_sync_views(self):
+        cases = (
+            (AsyncModuleListView, reverse('module-list'), {}),
+            (AsyncProfessorRatingsView, reverse('professor-ratings'), {}),
+            (AsyncProfessorRatingsView, reverse('professor-ratings') + '?limit=1', {}),
+            (AsyncProfessorModuleRatingView, reverse('professor-module-rating', args=['JE1', 'CD1']),
+             {'professor_id': 'JE1', 'module_code': 'CD1'}),
+        )
+        for view, path, kwargs in cases:
+            response = await self.call(view, path, **kwargs)
+            self.assertEqual(response.status_code, 200)
+            await get_cache().aclear()
+            expected = await sync_to_async(self.client.get)(path)
+            self.assertEqual(json.loads(response.content), expected.json())
+
+    async def test_conditional_get_and_not_found(self):
+        response = await self.call(AsyncModuleListView, reverse('module-list'))
+        self.assertIn('Last-Modified', response)
+        response = await self.call(AsyncModuleListView, reverse('module-list'),
+                                   headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.call(AsyncProfessorModuleRatingView, '/', professor_id='XX1', module_code='CD1')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_stream_and_invalid_page(self):
+        response = await self.call(AsyncProfessorRatingsView, reverse('professor-ratings') + '?stream=1')
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual([json.loads(line) for line in lines], [{'id': 'JE1', 'name': 'J. Excellent', 'rating': 4}])
+
+        response = await self.call(AsyncModuleListView, reverse('module-list') + '?limit=0')
+        self.assertEqual(response.status_code, 400)
+        cursor = encode_cursor(['CD1', 'abc', 1])
+        response = await self.call(AsyncModuleListView, reverse('module-list') + f'?cursor={cursor}')
+        self.assertEqual(response.status_code, 400)
+
+
+class CachedTokenAuthenticationTests(CatalogueTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def rate(self):
+        data = {'professor_id': 'JE1', 'module_code': 'CD1', 'year': 2018, 'semester': 1, 'rating': 4}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('rate'), data, format='json')
+
+    def test_repeated_requests_skip_the_token_lookup(self):
+        self.assertEqual(self.rate().status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.rate().status_code, 200)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+        self.assertEqual(cache_stats()['auth-token'], {'hits': 1, 'misses': 1})
+
+    def test_logout_invalidates_cached_token(self):
+        self.rate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+        self.assertEqual(self.rate().status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.rate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.rate().status_code, 401)
+
+    @override_settings(API_TOKEN_CACHE_SHARED=True)
+    def test_shared_cache_serves_other_processes(self):
+        self.rate()
+        clear_token_cache()  # 模拟另一个进程：本地 LRU 为空，只剩共享缓存
+        with CaptureQueriesContext(connection) as queries:
+            self.rate()
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        clear_token_cache()
+        self.assertEqual(self.rate().status_code, 401)
+
+
+class ThrottlingTests(ApiTestCase):
+    rates = {'login': '2/min', 'rate': '2/min', 'rate-bulk': '100/min'}
+
+    def setUp(self):
+        super().setUp()
+        User.objects.create_user(username='alice', password='secret')
+        patcher = mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', self.rates)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # 固定时钟：计数窗口按整分钟划分，测试跨过分钟边界时计数会被清零
+        clock = mock.patch.object(SimpleRateThrottle, 'timer', lambda throttle: 1_000_020.0)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def login(self):
+        return self.client.post(reverse('login'), {'username': 'alice', 'password': 'wrong'}, format='json')
+
+    def test_login_scope_is_limited_per_client(self):
+        self.assertEqual([self.login().status_code for _ in range(2)], [401, 401])
+        response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+        other = APIClient(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other.post(reverse('login'), {'username': 'alice', 'password': 'wrong'},
+                                    format='json').status_code, 401)
+
+    def test_only_writes_and_logins_are_throttled(self):
+        user = User.objects.get()
+        self.client.force_authenticate(user)
+        self.assertEqual([self.client.post(reverse('rate'), {}, format='json').status_code for _ in range(3)],
+                         [400, 400, 429])
+        for name in ('module-list', 'professor-ratings'):
+            self.assertEqual({self.client.get(reverse(name)).status_code for _ in range(3)}, {200})
+
+    @override_settings(API_MAX_CONCURRENT_WRITES=1, API_WRITE_QUEUE_TIMEOUT=0, API_SHED_RETRY_AFTER=3)
+    def test_saturated_writes_are_shed(self):
+        self.client.force_authenticate(User.objects.get())
+        semaphore = write_limiter.semaphore()
+        semaphore.acquire()
+        try:
+            response = self.client.post(reverse('rate'), {}, format='json')
+        finally:
+            semaphore.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+
+        self.assertEqual(self.client.post(reverse('rate'), {}, format='json').status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestingCommandTests(ApiTestCase):
+    def generate(self, **options):
+        call_command('generate_dataset', professors=6, modules=3, years=2, users=5, ratings_per_user=4,
+                     stdout=StringIO(), **options)
+
+    def test_generate_dataset(self):
+        self.generate()
+        self.assertEqual(Professor.objects.count(), 6)
+        self.assertEqual(ModuleInstance.objects.count(), 3 * 2 * 2)
+        self.assertEqual(ModuleInstance.professors.through.objects.count(), 3 * 2 * 2 * 2)
+        self.assertEqual(Rating.objects.count(), 5 * 4)
+        self.assertFalse(Rating.objects.filter(module_id=None).exists())
+        self.assertEqual(find_aggregate_drift(), [])
+
+        # 清除时不逐个聚合键更新，生成后整体重建
+        with mock.patch('api.aggregates._apply_delta') as applied:
+            self.generate(clear=True)
+        applied.assert_not_called()
+        self.assertEqual(Rating.objects.count(), 5 * 4)
+        self.assertEqual(find_aggregate_drift(), [])
+
+    def test_benchmark_api_reports_every_endpoint(self):
+        self.generate()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            call_command('benchmark_api', target='client', requests=2, output=output, stdout=StringIO())
+            with open(output) as f:
+                report = json.load(f)
+
+        results = report['results']['client']
+        # 每个路由都要被压测；列表接口另有分页、排行榜另有按学年筛选的变体
+        self.assertEqual(set(results), {pattern.name for pattern in urlpatterns} | {
+            'module-list-page', 'professor-ratings-page', 'professor-top-filtered'
+        })
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['requests'], 2)
+            self.assertIn('p99_ms', result)
+        self.assertGreater(results['rate']['queries_per_request'], 0)
+        self.assertEqual(report['dataset']['Rating'], Rating.objects.count())
+        # 压测创建的用户在结束时删除
+        self.assertFalse(User.objects.filter(username__startswith='bench-').exists())
+
+
+@override_settings(API_METRICS=True, API_METRICS_ALLOWED_IPS=['127.0.0.1'], API_METRICS_TOKEN='scrape-secret')
+class RequestMetricsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        professor = Professor.objects.create(id='JE1', name='J. Excellent')
+        Module.objects.create(code='CD1', name='Computing for Dummies').moduleinstance_set.create(
+            year=2018, semester=1
+        ).professors.add(professor)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('professor-module-rating', args=['JE1', 'CD1']))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[0-9.]+, db;dur=[0-9.]+;desc="1 queries"$')
+
+    async def test_server_timing_under_asgi(self):
+        response = await self.async_client.get(reverse('professor-module-rating', args=['JE1', 'CD1']))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('professor-module-rating', args=['JE1', 'CD1']))
+        self.client.get(reverse('professor-module-rating', args=['JE1', 'XX9']))
+        self.client.get(reverse('module-list'))
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('api_requests_total{view="professor-module-rating",method="GET",status="200"} 1', body)
+        self.assertIn('api_requests_total{view="professor-module-rating",method="GET",status="404"} 1', body)
+        self.assertIn('api_request_db_queries_sum{view="professor-module-rating"} 2', body)
+        self.assertIn('api_request_db_queries_bucket{view="professor-module-rating",le="+Inf"} 2', body)
+        self.assertIn('api_request_duration_seconds_count{view="module-list"} 1', body)
+        self.assertIn('# TYPE api_response_size_bytes histogram', body)
+
+    def test_metrics_access(self):
+        outsider = APIClient(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(outsider.get('/metrics').status_code, 403)
+        self.assertEqual(outsider.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(outsider.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+
+    @override_settings(API_METRICS=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('module-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        self.assertEqual(registry.render().count('api_requests_total{'), 0)
+
+
+class RequestProfilingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        overrides = override_settings(API_PROFILING=True, API_PROFILE_DIR=self.directory, API_PROFILE_KEEP=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.staff = User.objects.create_user(username='ops', password='secret', is_staff=True, is_superuser=True)
+        self.student = User.objects.create_user(username='alice', password='secret')
+        Professor.objects.create(id='JE1', name='J. Excellent')
+
+    def get(self, user=None, **headers):
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Token {Token.objects.get_or_create(user=user)[0].key}'
+        return self.client.get(reverse('professor-ratings'), **headers)
+
+    def test_staff_header_profiles_request(self):
+        response = self.get(self.staff, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        capture = ProfileCapture.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((capture.method, capture.path, capture.status), ('GET', '/api/professors/ratings/', 200))
+        self.assertEqual(capture.user, self.staff)
+        self.assertGreater(capture.query_count, 0)
+        self.assertTrue(capture.profile_path().exists())
+        self.assertIn('SELECT', capture.sql_path().read_text())
+
+    def test_only_staff_can_request_a_profile(self):
+        self.assertNotIn('X-Profile-Id', self.get(self.student, HTTP_X_PROFILE='1'))
+        self.assertNotIn('X-Profile-Id', self.get(HTTP_X_PROFILE='1'))
+        self.assertNotIn('X-Profile-Id', self.get(self.staff))
+        self.assertFalse(ProfileCapture.objects.exists())
+
+    def test_sql_params_are_redacted(self):
+        token = Token.objects.create(user=self.staff)
+        response = self.get(HTTP_AUTHORIZATION=f'Token {token.key}', HTTP_X_PROFILE='1')
+        sql = ProfileCapture.objects.get(pk=response['X-Profile-Id']).sql_path().read_text()
+        self.assertIn('-- params: str', sql)
+        self.assertNotIn(token.key, sql)
+
+    def test_sampling_is_limited_to_staff(self):
+        with override_settings(API_PROFILE_SAMPLE_RATE=1):
+            self.assertNotIn('X-Profile-Id', self.get())
+            self.assertNotIn('X-Profile-Id', self.get(self.student))
+            self.assertIn('X-Profile-Id', self.get(self.staff))
+            with override_settings(API_PROFILE_SAMPLE_ALL_USERS=True):
+                self.assertIn('X-Profile-Id', self.get())
+
+    def test_old_captures_are_pruned(self):
+        for _ in range(3):
+            self.get(self.staff, HTTP_X_PROFILE='1')
+        self.assertEqual(ProfileCapture.objects.count(), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+    def test_download_requires_view_permission(self):
+        capture = ProfileCapture.objects.get(pk=self.get(self.staff, HTTP_X_PROFILE='1')['X-Profile-Id'])
+        url = reverse('admin:api_profilecapture_download', args=[capture.pk])
+        viewer = User.objects.create_user(username='viewer', password='secret', is_staff=True)
+        self.client.force_login(viewer)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        viewer.user_permissions.add(Permission.objects.get(codename='view_profilecapture'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_admin_shows_capture(self):
+        capture = ProfileCapture.objects.get(pk=self.get(self.staff, HTTP_X_PROFILE='1')['X-Profile-Id'])
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('admin:api_profilecapture_change', args=[capture.pk]))
+        self.assertContains(response, 'Top functions by cumulative time')
+        self.assertContains(response, 'function calls')
+        response = self.client.get(reverse('admin:api_profilecapture_download', args=[capture.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+
+class ResponseFormatTests(ApiTestCase):
+    table = f'{TABLE_MEDIA_TYPE}, application/json;q=0.9'
+
+    def setUp(self):
+        super().setUp()
+        professor = Professor.objects.create(id='JE1', name='J. Excellent')
+        for number in range(10):
+            module = Module.objects.create(code=f'CD{number}', name=f'Computing for Dummies {number}')
+            module.moduleinstance_set.create(year=2018, semester=1).professors.add(professor)
+
+    def test_table_representation(self):
+        rows = self.client.get(reverse('module-list')).json()
+        response = self.client.get(reverse('module-list'), HTTP_ACCEPT=self.table)
+        self.assertEqual(response['Content-Type'], TABLE_MEDIA_TYPE)
+        table = json.loads(response.content)
+        self.assertEqual(table['count'], 10)
+        self.assertEqual(table['columns']['code'], [row['code'] for row in rows])
+        self.assertEqual(table, to_table(rows))
+        self.assertIn('Accept', response['Vary'])
+
+        page = json.loads(self.client.get(reverse('module-list') + '?limit=3', HTTP_ACCEPT=self.table).content)
+        self.assertEqual(page['results']['columns']['code'], ['CD0', 'CD1', 'CD2'])
+        self.assertIsNotNone(page['next_cursor'])
+
+    def test_accept_quality_is_honoured(self):
+        self.assertEqual(parse_accept('a/b;q=0.5, c/d, e/f;q=0'), ['c/d', 'a/b'])
+        for accept, content_type in ((self.table, TABLE_MEDIA_TYPE),
+                                     (f'application/json, {TABLE_MEDIA_TYPE};q=0.5', 'application/json'),
+                                     ('*/*', 'application/json')):
+            response = self.client.get(reverse('professor-ratings'), HTTP_ACCEPT=accept)
+            self.assertEqual(response['Content-Type'], content_type, accept)
+
+    def test_representations_have_their_own_etag(self):
+        json_etag = self.client.get(reverse('module-list'))['ETag']
+        table_etag = self.client.get(reverse('module-list'), HTTP_ACCEPT=self.table)['ETag']
+        self.assertNotEqual(json_etag, table_etag)
+        response = self.client.get(reverse('module-list'), HTTP_ACCEPT=self.table, HTTP_IF_NONE_MATCH=json_etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('module-list'), HTTP_ACCEPT=self.table, HTTP_IF_NONE_MATCH=table_etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_gzip_compression(self):
+        plain = self.client.get(reverse('module-list'))
+        response = self.client.get(reverse('module-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+        user = User.objects.create_user(username='alice', password='secret')
+        response = self.client.post(reverse('login'), {'username': 'alice', 'password': 'secret'},
+                                    format='json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response.json()['token'], Token.objects.get(user=user).key)
+
+    async def test_async_views_negotiate_table(self):
+        request = AsyncRequestFactory().get(reverse('module-list'), headers={'Accept': self.table})
+        response = await AsyncModuleListView.as_view()(request)
+        self.assertEqual(response['Content-Type'], TABLE_MEDIA_TYPE)
+        self.assertEqual(json.loads(response.content)['count'], 10)
+        self.assertTrue(response['ETag'].endswith('-table"'))
+
+
+class ProfessorLeaderboardTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [User.objects.create_user(username=f'user{i}', password='secret') for i in range(3)]
+        self.module = Module.objects.create(code='CD1', name='Computing for Dummies')
+        self.other_module = Module.objects.create(code='PG1', name='Programming for the Gifted')
+        self.autumn = ModuleInstance.objects.create(module=self.module, year=2018, semester=1)
+        self.spring = ModuleInstance.objects.create(module=self.other_module, year=2019, semester=2)
+        self.professors = Professor.objects.bulk_create(
+            Professor(id=code, name=name) for code, name in (('JE1', 'J. Excellent'), ('VS1', 'V. Smart'),
+                                                               ('TT1', 'T. Tardy'))
+        )
+        for instance in (self.autumn, self.spring):
+            instance.professors.add(*self.professors)
+
+    def rate(self, user, professor_id, instance, rating):
+        self.client.force_authenticate(user)
+        data = {'professor_id': professor_id, 'module_code': instance.module_id, 'year': instance.year,
+                'semester': instance.semester, 'rating': rating}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse('rate'), data, format='json').status_code, 200)
+        self.client.force_authenticate(None)
+
+    def seed(self):
+        # JE1: 5,4 in 2018 -> 4.5; VS1: 5 in 2018, 1 in 2019 -> 3.0; TT1: 2,2,2 in 2019 -> 2.0
+        self.rate(self.users[0], 'JE1', self.autumn, 5)
+        self.rate(self.users[1], 'JE1', self.autumn, 4)
+        self.rate(self.users[0], 'VS1', self.autumn, 5)
+        self.rate(self.users[0], 'VS1', self.spring, 1)
+        for user in self.users:
+            self.rate(user, 'TT1', self.spring, 2)
+
+    def top(self, **params):
+        response = self.client.get(reverse('professor-top'), params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['id'], row['average'], row['count']) for row in response.json()]
+
+    def test_overall_ranking_uses_exact_averages(self):
+        self.seed()
+        response = self.client.get(reverse('professor-top'))
+        self.assertEqual(response.json()[0], {'rank': 1, 'id': 'JE1', 'name': 'J. Excellent', 'average': 4.5,
+                                              'count': 2})
+        self.assertEqual(self.top(), [('JE1', 4.5, 2), ('VS1', 3.0, 2), ('TT1', 2.0, 3)])
+        self.assertEqual(self.top(limit=1), [('JE1', 4.5, 2)])
+        self.assertEqual(self.top(min_count=3), [('TT1', 2.0, 3)])
+
+    def test_ranking_filtered_by_module_instance(self):
+        self.seed()
+        self.assertEqual(self.top(year=2018), [('VS1', 5.0, 1), ('JE1', 4.5, 2)])
+        self.assertEqual(self.top(year=2019, semester=2), [('TT1', 2.0, 3), ('VS1', 1.0, 1)])
+        self.assertEqual(self.top(module='CD1', min_count=2), [('JE1', 4.5, 2)])
+        self.assertEqual(self.top(year=2018, semester=2), [])
+
+    def test_ties_are_broken_by_count_then_id(self):
+        self.rate(self.users[0], 'VS1', self.autumn, 4)
+        self.rate(self.users[0], 'JE1', self.autumn, 4)
+        self.rate(self.users[0], 'TT1', self.autumn, 4)
+        self.rate(self.users[1], 'TT1', self.autumn, 4)
+        self.assertEqual([row[0] for row in self.top()], ['TT1', 'JE1', 'VS1'])
+        self.assertEqual([row[0] for row in self.top(year=2018)], ['TT1', 'JE1', 'VS1'])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'limit': 0}, {'limit': 101}, {'limit': 'x'}, {'min_count': 0}, {'semester': 3},
+                       {'year': 'soon'}):
+            response = self.client.get(reverse('professor-top'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+    def test_cached_until_ratings_or_catalogue_change(self):
+        self.seed()
+        etag = self.client.get(reverse('professor-top'), {'year': 2018})['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.top(year=2018)[0][0], 'VS1')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.autumn.year = 2017
+            self.autumn.save()
+        response = self.client.get(reverse('professor-top'), {'year': 2018}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+        self.rate(self.users[2], 'VS1', self.spring, 5)
+        self.assertEqual(self.top(year=2019), [('VS1', 3.0, 2), ('TT1', 2.0, 3)])
+
+    def test_instance_aggregates_follow_deletes_and_rebuild(self):
+        self.seed()
+        Rating.objects.filter(professor_id='VS1', module_instance=self.spring).delete()
+        self.assertEqual(self.top(year=2019), [('TT1', 2.0, 3)])
+        self.assertEqual(find_aggregate_drift(), [])
+
+        ProfessorModuleInstanceRatingAggregate.objects.update(rating_sum=0)
+        self.assertEqual(len(find_aggregate_drift()), 3)
+        rebuild_aggregates()
+        self.assertEqual(find_aggregate_drift(), [])
+
+
+class RatingHistogramTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [User.objects.create_user(username=f'user{i}', password='secret') for i in range(3)]
+        self.professor = Professor.objects.create(id='JE1', name='J. Excellent')
+        self.module = Module.objects.create(code='CD1', name='Computing for Dummies')
+        self.autumn = ModuleInstance.objects.create(module=self.module, year=2018, semester=1)
+        self.spring = ModuleInstance.objects.create(module=self.module, year=2019, semester=2)
+        for instance in (self.autumn, self.spring):
+            instance.professors.add(self.professor)
+
+    def rate(self, user, instance, rating):
+        self.client.force_authenticate(user)
+        data = {'professor_id': 'JE1', 'module_code': 'CD1', 'year': instance.year, 'semester': instance.semester,
+                'rating': rating}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse('rate'), data, format='json').status_code, 200)
+        self.client.force_authenticate(None)
+
+    def histogram(self, **params):
+        response = self.client.get(reverse('professor-histogram', args=['JE1']), params)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return [body['histogram'][str(stars)] for stars in range(1, 6)], body['count']
+
+    def test_upserts_move_the_rating_between_stars(self):
+        self.rate(self.users[0], self.autumn, 5)
+        self.rate(self.users[1], self.autumn, 3)
+        self.rate(self.users[0], self.spring, 1)
+        self.assertEqual(self.histogram(), ([1, 0, 1, 0, 1], 3))
+
+        self.rate(self.users[1], self.autumn, 4)
+        self.assertEqual(self.histogram(), ([1, 0, 0, 1, 1], 3))
+        self.assertEqual(ProfessorRatingAggregate.objects.values_list(*STAR_FIELDS).get(), (1, 0, 0, 1, 1))
+        self.assertEqual(find_aggregate_drift(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.filter(user=self.users[0], module_instance=self.spring).delete()
+        self.assertEqual(self.histogram(), ([0, 0, 0, 1, 1], 2))
+        self.assertEqual(find_aggregate_drift(), [])
+
+    def test_histogram_of_selected_module_instances(self):
+        self.rate(self.users[0], self.autumn, 5)
+        self.rate(self.users[1], self.autumn, 5)
+        self.rate(self.users[0], self.spring, 2)
+
+        self.assertEqual(self.histogram(year=2018), ([0, 0, 0, 0, 2], 2))
+        self.assertEqual(self.histogram(year=2019, semester=2, module='CD1'), ([0, 1, 0, 0, 0], 1))
+        self.assertEqual(self.histogram(year=2020), ([0, 0, 0, 0, 0], 0))
+        response = self.client.get(reverse('professor-histogram', args=['JE1']))
+        self.assertEqual(response.json()['average'], 4.0)
+
+    def test_bulk_rate_keeps_histograms(self):
+        self.client.force_authenticate(self.users[0])
+        item = {'professor_id': 'JE1', 'module_code': 'CD1', 'year': 2018, 'semester': 1}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('rate-bulk'), {'ratings': [
+                dict(item, rating=2), dict(item, year=2019, semester=2, rating=3),
+            ]}, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('rate-bulk'), {'ratings': [dict(item, rating=4)]}, format='json')
+        self.assertEqual(self.histogram(), ([0, 0, 1, 1, 0], 2))
+        self.assertEqual(find_aggregate_drift(), [])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(reverse('professor-histogram', args=['XX1'])).status_code, 404)
+        response = self.client.get(reverse('professor-histogram', args=['JE1']), {'semester': 3})
+        self.assertEqual(response.status_code, 400)
+
+    def test_check_command_recomputes_histograms(self):
+        self.rate(self.users[0], self.autumn, 5)
+        ProfessorModuleInstanceRatingAggregate.objects.update(stars_5=0, stars_1=1)
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rating_aggregates', '--check', stdout=out)
+        self.assertIn('stars_1 stored 1, expected 0, stars_5 stored 0, expected 1', out.getvalue())
+
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        self.assertEqual(find_aggregate_drift(), [])
+        self.assertEqual(self.histogram(year=2018), ([0, 0, 0, 0, 1], 1))
+
+
+class CatalogueImportExportTests(ApiTestCase):
+    CSV = (
+        'kind,code,name,year,semester,professors\n'
+        'professor,JE1,J. Excellent,,,\n'
+        'professor,VS1,V. Smart,,,\n'
+        'module,CD1,Computing for Dummies,,,\n'
+        'instance,CD1,,2017,1,JE1;VS1\n'
+        'instance,CD1,,2018,2,VS1\n'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def import_file(self, path, *args):
+        out = StringIO()
+        call_command('import_catalogue', path, *args, stdout=out)
+        return out.getvalue()
+
+    def export_file(self, name, *args):
+        path = os.path.join(self.directory.name, name)
+        call_command('export_catalogue', path, *args, stderr=StringIO())
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def teaching(self):
+        return sorted(ModuleInstance.professors.through.objects.values_list(
+            'moduleinstance__module_id', 'moduleinstance__year', 'moduleinstance__semester', 'professor_id'
+        ))
+
+    def test_import_is_idempotent_and_upserts_names(self):
+        path = self.write('catalogue.csv', self.CSV)
+        self.assertIn('2 module instances (2 new), 3 new teaching assignments', self.import_file(path))
+        self.assertEqual(self.client.get(reverse('module-list')).json()[0]['name'], 'Computing for Dummies')
+
+        renamed = self.write('renamed.csv', self.CSV.replace('Computing for Dummies', 'Computing for Experts'))
+        output = self.import_file(renamed)
+        self.assertIn('2 professors (0 new)', output)
+        self.assertIn('2 module instances (0 new), 0 new teaching assignments', output)
+        self.assertEqual(self.teaching(), [('CD1', 2017, 1, 'JE1'), ('CD1', 2017, 1, 'VS1'), ('CD1', 2018, 2, 'VS1')])
+        # 批量写入不触发 post_save 信号，命令结束时统一让缓存失效
+        self.assertEqual(self.client.get(reverse('module-list')).json()[0]['name'], 'Computing for Experts')
+
+    def test_export_round_trips_through_both_formats(self):
+        self.import_file(self.write('catalogue.csv', self.CSV))
+        Professor.objects.create(id='ZZ9', name='Not Teaching')
+        exported_json = self.export_file('catalogue.jsonl')
+        exported_csv = self.export_file('catalogue.csv')
+        self.assertIn('{"kind":"instance","code":"CD1","year":2017,"semester":1,"professors":["JE1","VS1"]}',
+                      exported_json)
+
+        ModuleInstance.objects.all().delete()
+        Module.objects.all().delete()
+        Professor.objects.all().delete()
+        self.import_file(self.write('again.jsonl', exported_json))
+        self.assertEqual(self.export_file('again.csv'), exported_csv)
+        self.assertTrue(Professor.objects.filter(pk='ZZ9').exists())
+
+    def test_query_count_depends_on_batches_not_rows(self):
+        rows = ''.join(f'professor,P{i:03d},Professor {i},,,\n' for i in range(200))
+        rows += 'module,CD1,Computing for Dummies,,,\n'
+        rows += ''.join(f'instance,CD1,,{2000 + i},1,P{i:03d};P{i + 1:03d}\n' for i in range(150))
+        path = self.write('large.csv', 'kind,code,name,year,semester,professors\n' + rows)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.import_file(path, '--batch-size', '100')
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        # 教授 2 批 × 2 条、模块 1 批 × 2 条、实例 2 批 × 最多 8 条
+        self.assertLessEqual(len(statements), 2 * 2 + 2 + 2 * 8)
+        self.assertEqual(ModuleInstance.professors.through.objects.count(), 300)
+
+    def test_rejects_bad_records(self):
+        cases = [
+            ('instance,XX1,,2017,1,JE1\n', 'Line 2: unknown module XX1.'),
+            ('professor,JE1,J. Excellent,,,\nmodule,CD1,Computing for Dummies,,,\ninstance,CD1,,2017,1,JE1;NOPE\n',
+             'Line 4: unknown professor(s) NOPE.'),
+            ('instance,CD1,,2017,3,\n', 'semester must be 1 or 2'),
+            ('lecturer,JE1,J. Excellent,,,\n', 'kind must be one of'),
+        ]
+        for rows, message in cases:
+            path = self.write('bad.csv', 'kind,code,name,year,semester,professors\n' + rows)
+            with self.assertRaisesMessage(CommandError, message):
+                self.import_file(path)
+        self.assertFalse(ModuleInstance.objects.exists())
+
+
+class AdminChangelistTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(username='admin', password='secret', email='admin@example.com')
+        self.client.force_login(self.admin)
+        self.module = Module.objects.create(code='CD1', name='Computing for Dummies')
+        self.professors = Professor.objects.bulk_create(
+            Professor(id=f'P{i:03d}', name=f'Professor {i}') for i in range(4)
+        )
+
+    def seed(self, instances):
+        created = ModuleInstance.objects.bulk_create(
+            ModuleInstance(module=self.module, year=2000 + i // 2, semester=1 + i % 2) for i in range(instances)
+        )
+        Through = ModuleInstance.professors.through
+        Through.objects.bulk_create(
+            Through(moduleinstance_id=instance.pk, professor_id=professor.pk)
+            for instance in created for professor in self.professors[:2]
+        )
+        users = User.objects.bulk_create(User(username=f'user{i}') for i in range(instances))
+        Rating.objects.bulk_create(
+            Rating(user=user, professor=self.professors[0], module_instance=instance, rating=1 + i % 5)
+            for i, (user, instance) in enumerate(zip(users, created))
+        )
+
+    def changelist_queries(self, name, instances, **params):
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.all().delete()
+            ModuleInstance.objects.all().delete()
+            User.objects.exclude(pk=self.admin.pk).delete()
+            self.seed(instances)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:api_{name}_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_rating_filter_does_not_query_distinct_values(self):
+        self.seed(3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:api_rating_changelist'), {'rating': 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if 'DISTINCT' in query['sql']])
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for name in ('rating', 'moduleinstance'):
+            self.assertEqual(self.changelist_queries(name, 5), self.changelist_queries(name, 60), name)
+        self.assertEqual(self.changelist_queries('rating', 5, rating=3),
+                         self.changelist_queries('rating', 60, rating=3))
+
+    @override_settings(API_ADMIN_EXACT_COUNT_LIMIT=10)
+    def test_large_unfiltered_changelist_uses_estimated_count(self):
+        self.seed(30)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:api_rating_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, Rating.objects.order_by('-pk')[0].pk)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql'] and 'api_rating' in query['sql']])
+
+        response = self.client.get(reverse('admin:api_rating_changelist'), {'rating': 3})
+        self.assertEqual(response.context['cl'].result_count, 6)
+
+    def test_change_forms_use_autocomplete_widgets(self):
+        self.seed(3)
+        response = self.client.get(reverse('admin:api_rating_change', args=[Rating.objects.first().pk]))
+        self.assertEqual(response.status_code, 200)
+        for field in ('user', 'professor', 'module_instance'):
+            self.assertIn('admin-autocomplete', str(response.context['adminform'].form[field]))
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'api', 'model_name': 'rating', 'field_name': 'module_instance', 'term': 'CD1',
+        })
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_admin_edits_keep_aggregates_in_sync(self):
+        self.seed(3)
+        rebuild_aggregates()
+        rating = Rating.objects.order_by('pk').first()
+        other = ModuleInstance.objects.exclude(pk=rating.module_instance_id).first()
+        form = {'user': rating.user_id, 'professor': self.professors[1].pk, 'module_instance': other.pk,
+                'rating': 5}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:api_rating_change', args=[rating.pk]), form)
+        self.assertEqual(response.status_code, 302)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:api_rating_add'), dict(form, user=self.admin.pk, rating=2))
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(Rating.objects.count(), 4)
+        self.assertEqual(find_aggregate_drift(), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'plan assertions use SQLite EXPLAIN QUERY PLAN output')
+    def test_rating_filter_is_an_index_search(self):
+        plan = Rating.objects.filter(rating=3).order_by('-pk')[:100].explain()
+        self.assertIn('rating_star_filter', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
@@ -1,19 +1,32 @@
 # api/urls.py
 
+from django.conf import settings
 from django.urls import path
 from .views import (
     RegisterView, LoginView, LogoutView,
     ModuleListView, ProfessorRatingsView,
-    ProfessorModuleRatingView, RateView
+    ProfessorModuleRatingView, RateView, BulkRateView, CacheStatsView, TopProfessorsView,
+    ProfessorHistogramView
 )
 
+if settings.API_ASYNC_READS:
+    from .async_views import (
+        AsyncModuleListView as ModuleListView,
+        AsyncProfessorRatingsView as ProfessorRatingsView,
+        AsyncProfessorModuleRatingView as ProfessorModuleRatingView,
+    )
+
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('modules/', ModuleListView.as_view(), name='module-list'),
+    path('professors/top/', TopProfessorsView.as_view(), name='professor-top'),
     path('professors/ratings/', ProfessorRatingsView.as_view(), name='professor-ratings'),
+    path('professors/<str:professor_id>/histogram/', ProfessorHistogramView.as_view(), name='professor-histogram'),
     path('professors/<str:professor_id>/modules/<str:module_code>/rating/',
          ProfessorModuleRatingView.as_view(), name='professor-module-rating'),
     path('rate/', RateView.as_view(), name='rate'),
+    path('rate/bulk/', BulkRateView.as_view(), name='rate-bulk'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
 ]
\ No newline at end of file
@@ -4,12 +4,35 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.db.models import Avg
-from .models import Professor, Module, ModuleInstance, Rating
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+from django.db import transaction
+from django.db.models import Exists, F, FilteredRelation, FloatField, OuterRef, Q, Sum
+from django.db.models.functions import Cast
+from .aggregates import apply_rating_changes, lock_professor_aggregates
+from .cache import (
+    CATALOGUE_SCOPE, MODULE_LIST_KEY, PROFESSOR_RATINGS_KEY, RATINGS_SCOPE, cached, cache_stats, data_etag,
+    data_last_modified, invalidate_rating, invalidate_ratings, page_key, professor_module_rating_key,
+    professor_histogram_key, professor_top_key
+)
+from .metrics import metrics_access_allowed, registry
+from .models import (
+    STAR_FIELDS, Professor, Module, ModuleInstance, ProfessorModuleInstanceRatingAggregate, ProfessorRatingAggregate,
+    Rating
+)
+from .pagination import (
+    InvalidPage, is_paginated, is_streamed, keyset_page, ndjson_response, page_request
+)
+from .renderers import listing_format
 from .serializers import UserSerializer, ProfessorSerializer, ModuleSerializer, ModuleInstanceSerializer, \
     RatingSerializer
+from .throttling import CacheScopedRateThrottle, login_limiter, shed_load, write_limiter
 
 
 class RegisterView(APIView):
@@ -23,6 +46,10 @@ class RegisterView(APIView):
 
 
 class LoginView(APIView):
+    throttle_classes = [CacheScopedRateThrottle]
+    throttle_scope = 'login'
+
+    @shed_load(login_limiter)
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
@@ -41,108 +68,527 @@ class LogoutView(APIView):
         return Response({'success': True}, status=status.HTTP_200_OK)
 
 
+def conditional_on(*scopes):
+    """Answer GET/HEAD with 304 Not Modified while the data versions of scopes are unchanged"""
+    conditional = method_decorator(condition(
+        etag_func=lambda request, *args, **kwargs: data_etag(*scopes, variant=listing_format(request)),
+        last_modified_func=lambda request, *args, **kwargs: data_last_modified(*scopes),
+    ))
+    vary = method_decorator(vary_on_headers('Accept'))
+    return lambda method: vary(conditional(method))
+
+
 class ModuleListView(APIView):
+    # 游标中排序键各位置的类型：(模块代码, 年份, 学期)
+    cursor_types = (str, int, int)
+
+    @conditional_on(CATALOGUE_SCOPE)
     def get(self, request):
-        module_instances = ModuleInstance.objects.all()
-        result = []
-
-        for instance in module_instances:
-            module_data = {
-                'code': instance.module.code,
-                'name': instance.module.name,
-                'year': instance.year,
-                'semester': instance.semester,
-                'professors': []
-            }
+        if is_streamed(request):
+            return ndjson_response(self.page_queryset(None), self.module_instance_row)
+        if is_paginated(request):
+            try:
+                cursor, limit, after = page_request(request, self.cursor_types)
+            except InvalidPage as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            result = cached('module-list', page_key(MODULE_LIST_KEY, CATALOGUE_SCOPE, cursor, limit),
+                            lambda: self.build_module_page(after, limit))
+            return Response(result, status=status.HTTP_200_OK)
+
+        result = cached('module-list', MODULE_LIST_KEY, self.build_module_list)
+        return Response(result, status=status.HTTP_200_OK)
 
-            for professor in instance.professors.all():
-                module_data['professors'].append({
-                    'id': professor.id,
-                    'name': professor.name
-                })
+    @staticmethod
+    def module_instances():
+        return ModuleInstance.objects.select_related('module').prefetch_related('professors')
 
-            result.append(module_data)
+    @staticmethod
+    def module_instance_row(instance):
+        return {
+            'code': instance.module.code,
+            'name': instance.module.name,
+            'year': instance.year,
+            'semester': instance.semester,
+            'professors': [
+                {'id': professor.id, 'name': professor.name} for professor in instance.professors.all()
+            ]
+        }
 
-        return Response(result, status=status.HTTP_200_OK)
+    @classmethod
+    def build_module_list(cls):
+        return [cls.module_instance_row(instance) for instance in cls.module_instances()]
+
+    @staticmethod
+    def module_instance_key(instance):
+        return instance.module_id, instance.year, instance.semester
+
+    @classmethod
+    def page_queryset(cls, after):
+        # 键集分页：按 (module, year, semester) 唯一索引顺序读取游标之后的行
+        queryset = cls.module_instances().order_by('module_id', 'year', 'semester')
+        if after:
+            module_code, year, semester = after
+            queryset = queryset.filter(
+                Q(module_id__gt=module_code)
+                | Q(module_id=module_code, year__gt=year)
+                | Q(module_id=module_code, year=year, semester__gt=semester)
+            )
+        return queryset
+
+    @classmethod
+    def build_module_page(cls, after, limit):
+        return keyset_page(cls.page_queryset(after), limit, cls.module_instance_row, cls.module_instance_key)
 
 
 class ProfessorRatingsView(APIView):
+    cursor_types = (str,)
+
+    @conditional_on(RATINGS_SCOPE)
     def get(self, request):
-        professors = Professor.objects.all()
-        result = []
+        if is_streamed(request):
+            return ndjson_response(self.professors(), self.professor_rating_row)
+        if is_paginated(request):
+            try:
+                cursor, limit, after = page_request(request, self.cursor_types)
+            except InvalidPage as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            result = cached('professor-ratings', page_key(PROFESSOR_RATINGS_KEY, RATINGS_SCOPE, cursor, limit),
+                            lambda: self.build_professor_page(after, limit))
+            return Response(result, status=status.HTTP_200_OK)
 
-        for professor in professors:
-            avg_rating = Rating.objects.filter(professor=professor).aggregate(Avg('rating'))['rating__avg'] or 0
-            rounded_rating = round(avg_rating)
+        result = cached('professor-ratings', PROFESSOR_RATINGS_KEY, self.build_professor_ratings)
+        return Response(result, status=status.HTTP_200_OK)
 
-            result.append({
-                'id': professor.id,
-                'name': professor.name,
-                'rating': rounded_rating
-            })
+    @staticmethod
+    def professors():
+        return Professor.objects.annotate(
+            rating_sum=F('rating_aggregate__rating_sum'),
+            rating_count=F('rating_aggregate__rating_count'),
+        ).order_by('pk')
 
-        return Response(result, status=status.HTTP_200_OK)
+    @staticmethod
+    def professor_rating_row(professor):
+        avg_rating = professor.rating_sum / professor.rating_count if professor.rating_count else 0
+        return {
+            'id': professor.id,
+            'name': professor.name,
+            'rating': round(avg_rating)
+        }
+
+    @classmethod
+    def build_professor_ratings(cls):
+        return [cls.professor_rating_row(professor) for professor in cls.professors()]
+
+    @staticmethod
+    def professor_key(professor):
+        return (professor.pk,)
+
+    @classmethod
+    def page_queryset(cls, after):
+        queryset = cls.professors()
+        if after:
+            queryset = queryset.filter(pk__gt=after[0])
+        return queryset
+
+    @classmethod
+    def build_professor_page(cls, after, limit):
+        return keyset_page(cls.page_queryset(after), limit, cls.professor_rating_row, cls.professor_key)
 
 
 class ProfessorModuleRatingView(APIView):
     def get(self, request, professor_id, module_code):
+        result = cached(
+            'professor-module-rating',
+            professor_module_rating_key(professor_id, module_code),
+            lambda: self.build_professor_module_rating(professor_id, module_code)
+        )
+        if result is None:
+            return Response({'error': 'Professor or module not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(result, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def rating_lookup(professor_id, module_code):
+        # 一次查询：教授行 LEFT JOIN 该模块的聚合行，模块是否存在由 EXISTS 子查询判断
+        return Professor.objects.filter(pk=professor_id).annotate(
+            module_aggregate=FilteredRelation(
+                'professormoduleratingaggregate',
+                condition=Q(professormoduleratingaggregate__module_id=module_code),
+            ),
+            module_exists=Exists(Module.objects.filter(pk=module_code)),
+        ).values_list(
+            'module_exists', 'module_aggregate__rating_sum', 'module_aggregate__rating_count'
+        )
+
+    @staticmethod
+    def rating_payload(row):
+        """Turn a rating_lookup() row into the response payload, or None if professor or module is missing"""
+        if row is None or not row[0]:
+            return None
+        _, rating_sum, rating_count = row
+        if rating_count:
+            return {'rating': round(rating_sum / rating_count), 'count': rating_count}
+        return {'rating': 0, 'count': 0}
+
+    @classmethod
+    def build_professor_module_rating(cls, professor_id, module_code):
+        return cls.rating_payload(cls.rating_lookup(professor_id, module_code).first())
+
+
+def query_int(request, name, default=None, low=None, high=None):
+    """An integer query parameter within [low, high]; raises ValueError with a message for the client"""
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise ValueError(f'{name} must be between {low} and {high}' if high is not None
+                         else f'{name} must be at least {low}')
+    return value
+
+
+def instance_params(request):
+    """The year, semester and module query parameters that select module instances"""
+    return {
+        'year': query_int(request, 'year'),
+        'semester': query_int(request, 'semester', None, 1, 2),
+        'module': request.GET.get('module') or None,
+    }
+
+
+def instance_filters(prefix, year, semester, module):
+    """Queryset filters for instance_params(), on the module instance reached through prefix"""
+    filters = {}
+    if year is not None:
+        filters[f'{prefix}year'] = year
+    if semester is not None:
+        filters[f'{prefix}semester'] = semester
+    if module is not None:
+        filters[f'{prefix}module_id'] = module
+    return filters
+
+
+class TopProfessorsView(APIView):
+    """Professors ranked by exact average rating, optionally limited to ratings of some module instances"""
+    default_limit = 10
+    max_limit = 100
+
+    @conditional_on(RATINGS_SCOPE, CATALOGUE_SCOPE)
+    def get(self, request):
         try:
-            professor = Professor.objects.get(id=professor_id)
-            module = Module.objects.get(code=module_code)
-            module_instances = ModuleInstance.objects.filter(module=module)
+            params = self.ranking_params(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        result = cached('professor-top', professor_top_key(**params), lambda: self.build_ranking(**params))
+        return Response(result, status=status.HTTP_200_OK)
 
-            ratings = Rating.objects.filter(
-                professor=professor,
-                module_instance__in=module_instances
-            )
+    @classmethod
+    def ranking_params(cls, request):
+        """Validated query parameters; raises ValueError with a message for the client"""
+        return {
+            'limit': query_int(request, 'limit', cls.default_limit, 1, cls.max_limit),
+            'min_count': query_int(request, 'min_count', 1, 1),
+            **instance_params(request),
+        }
 
-            if ratings.exists():
-                avg_rating = ratings.aggregate(Avg('rating'))['rating__avg']
-                rounded_rating = round(avg_rating)
-                return Response({'rating': rounded_rating}, status=status.HTTP_200_OK)
-            else:
-                return Response({'rating': 0}, status=status.HTTP_200_OK)
-        except (Professor.DoesNotExist, Module.DoesNotExist):
-            return Response({'error': 'Professor or module not found'}, status=status.HTTP_404_NOT_FOUND)
+    @staticmethod
+    def ranking_row(rank, row):
+        return {'rank': rank, 'id': row['professor_id'], 'name': row['professor__name'], 'average': row['average'],
+                'count': row['count']}
+
+    @staticmethod
+    def overall_ranking(min_count):
+        # 直接按 professor_aggregate_ranking 索引顺序读取，取前 N 行即可停止
+        return ProfessorRatingAggregate.objects.filter(rating_count__gte=min_count).order_by(
+            '-average', '-rating_count', 'professor_id'
+        ).values('professor_id', 'professor__name', 'average', count=F('rating_count'))
+
+    @staticmethod
+    def filtered_ranking(min_count, year, semester, module):
+        # 按教授汇总所选课程实例的聚合行；行数与教授 × 实例数相当，与 Rating 表大小无关
+        filters = instance_filters('module_instance__', year, semester, module)
+        return ProfessorModuleInstanceRatingAggregate.objects.filter(rating_count__gt=0, **filters).values(
+            'professor_id', 'professor__name'
+        ).annotate(
+            total=Sum('rating_sum'), count=Sum('rating_count'),
+        ).annotate(
+            average=Cast('total', FloatField()) / F('count'),
+        ).filter(count__gte=min_count).order_by('-average', '-count', 'professor_id').values(
+            'professor_id', 'professor__name', 'average', 'count'
+        )
+
+    @classmethod
+    def build_ranking(cls, limit, min_count, year, semester, module):
+        if year is None and semester is None and module is None:
+            queryset = cls.overall_ranking(min_count)
+        else:
+            queryset = cls.filtered_ranking(min_count, year, semester, module)
+        return [cls.ranking_row(rank, row) for rank, row in enumerate(queryset[:limit], 1)]
+
+
+class ProfessorHistogramView(APIView):
+    """Number of 1 to 5 star ratings of a professor, optionally only in some module instances"""
+
+    @conditional_on(RATINGS_SCOPE, CATALOGUE_SCOPE)
+    def get(self, request, professor_id):
+        try:
+            params = instance_params(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        result = cached('professor-histogram', professor_histogram_key(professor_id, **params),
+                        lambda: self.build_histogram(professor_id, **params))
+        if result is None:
+            return Response({'error': 'Professor not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(result, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def histogram_lookup(professor_id, year, semester, module):
+        # 一次查询：不筛选时读取教授聚合行，否则汇总所选课程实例的聚合行
+        filters = instance_filters('module_instance__', year, semester, module)
+        if not filters:
+            values = {field: F(f'rating_aggregate__{field}') for field in ('rating_count',) + STAR_FIELDS}
+        else:
+            relation = 'professormoduleinstanceratingaggregate'
+            condition = Q(**{f'{relation}__{lookup}': value for lookup, value in filters.items()})
+            values = {
+                field: Sum(f'{relation}__{field}', filter=condition) for field in ('rating_count',) + STAR_FIELDS
+            }
+        return Professor.objects.filter(pk=professor_id).values('id', 'name', **values)
+
+    @staticmethod
+    def histogram_payload(row):
+        if row is None:
+            return None
+        histogram = {str(stars): row[field] or 0 for stars, field in enumerate(STAR_FIELDS, 1)}
+        count = row['rating_count'] or 0
+        average = sum(stars * n for stars, n in enumerate(histogram.values(), 1)) / count if count else 0
+        return {'id': row['id'], 'name': row['name'], 'count': count, 'average': average, 'histogram': histogram}
+
+    @classmethod
+    def build_histogram(cls, professor_id, year, semester, module):
+        return cls.histogram_payload(cls.histogram_lookup(professor_id, year, semester, module).first())
+
+
+def parse_rating(value):
+    """Return value as an int between 1 and 5, or None if it is not a valid rating"""
+    try:
+        rating_value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return rating_value if 1 <= rating_value <= 5 else None
 
 
 class RateView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [CacheScopedRateThrottle]
+    throttle_scope = 'rate'
 
+    @shed_load(write_limiter)
     def post(self, request):
         professor_id = request.data.get('professor_id')
         module_code = request.data.get('module_code')
         year = request.data.get('year')
         semester = request.data.get('semester')
-        rating_value = request.data.get('rating')
+        rating_value = parse_rating(request.data.get('rating'))
+
+        if rating_value is None:
+            return Response(
+                {'error': 'Rating must be an integer between 1 and 5'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         try:
-            professor = Professor.objects.get(id=professor_id)
-            module = Module.objects.get(code=module_code)
-            module_instance = ModuleInstance.objects.get(
-                module=module,
-                year=year,
-                semester=semester
+            year = int(year)
+            semester = int(semester)
+        except (TypeError, ValueError):
+            return Response({'error': 'Year and semester must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 一次查询：按 (module, year, semester) 唯一键找到模块实例，并通过中间表检查授课关系
+        lookup = ModuleInstance.objects.filter(
+            module_id=module_code, year=year, semester=semester
+        ).annotate(
+            teaches=Exists(ModuleInstance.professors.through.objects.filter(
+                moduleinstance_id=OuterRef('pk'), professor_id=professor_id
+            )),
+            professor_exists=Exists(Professor.objects.filter(pk=professor_id)),
+        ).values_list('pk', 'teaches', 'professor_exists').first()
+
+        if lookup is None or not lookup[2]:
+            return Response(
+                {'error': 'Professor, module or module instance not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        module_instance_id, teaches, _ = lookup
+        if not teaches:
+            return Response(
+                {'error': 'Professor does not teach this module instance'},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-            # 检查教授是否教授此模块实例
-            if professor not in module_instance.professors.all():
-                return Response(
-                    {'error': 'Professor does not teach this module instance'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        # ?dry_run=1 只校验评分三元组，不写入
+        if request.query_params.get('dry_run') in ('1', 'true'):
+            return Response({'success': True, 'dry_run': True}, status=status.HTTP_200_OK)
 
-            # 创建或更新评分
-            rating, created = Rating.objects.update_or_create(
+        # 以 INSERT ... ON CONFLICT 创建或更新评分，并在同一事务中更新聚合表。
+        # 先锁定教授的聚合行再读取旧评分：该行尚不存在时 SELECT ... FOR UPDATE 锁不住任何东西，
+        # 并发的首次评分会都读到 None 而重复计数
+        with transaction.atomic():
+            lock_professor_aggregates([professor_id])
+            old_rating = Rating.objects.filter(
                 user=request.user,
-                professor=professor,
-                module_instance=module_instance,
-                defaults={'rating': rating_value}
+                professor_id=professor_id,
+                module_instance_id=module_instance_id
+            ).values_list('rating', flat=True).first()
+
+            Rating.objects.bulk_create(
+                [Rating(user=request.user, professor_id=professor_id, module_instance_id=module_instance_id,
+                        module_id=module_code, rating=rating_value)],
+                update_conflicts=True,
+                unique_fields=['user', 'professor', 'module_instance'],
+                update_fields=['rating'],
             )
 
-            return Response({'success': True}, status=status.HTTP_200_OK)
-        except (Professor.DoesNotExist, Module.DoesNotExist, ModuleInstance.DoesNotExist):
+            apply_rating_changes([(professor_id, module_code, module_instance_id, old_rating, rating_value)])
+            transaction.on_commit(lambda: invalidate_rating(professor_id, module_code))
+
+        return Response({'success': True}, status=status.HTTP_200_OK)
+
+
+class BulkRateView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [CacheScopedRateThrottle]
+    throttle_scope = 'rate-bulk'
+    max_items = 10000
+
+    @shed_load(write_limiter)
+    def post(self, request):
+        items = request.data.get('ratings') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of ratings'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
             return Response(
-                {'error': 'Professor, module or module instance not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
\ No newline at end of file
+                {'error': f'At most {self.max_items} ratings can be submitted per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = [None] * len(items)
+        parsed = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[index] = {'index': index, 'success': False, 'error': 'Expected an object'}
+                continue
+            rating_value = parse_rating(item.get('rating'))
+            try:
+                year = int(item.get('year'))
+                semester = int(item.get('semester'))
+            except (TypeError, ValueError):
+                year = semester = None
+            if rating_value is None:
+                results[index] = {'index': index, 'success': False,
+                                  'error': 'Rating must be an integer between 1 and 5'}
+            elif year is None:
+                results[index] = {'index': index, 'success': False,
+                                  'error': 'Year and semester must be integers'}
+            else:
+                parsed[index] = (str(item.get('professor_id')), str(item.get('module_code')),
+                                 year, semester, rating_value)
+
+        # 预先加载所有查找表，避免逐条查询
+        module_codes = {row[1] for row in parsed.values()}
+        instances = {
+            (module_code, year, semester): pk
+            for pk, module_code, year, semester in ModuleInstance.objects.filter(
+                module_id__in=module_codes,
+                year__in={row[2] for row in parsed.values()},
+                semester__in={row[3] for row in parsed.values()},
+            ).values_list('pk', 'module_id', 'year', 'semester')
+        }
+        professor_ids = set(Professor.objects.filter(
+            id__in={row[0] for row in parsed.values()}
+        ).values_list('id', flat=True))
+        teaching = set(ModuleInstance.professors.through.objects.filter(
+            moduleinstance_id__in=instances.values()
+        ).values_list('professor_id', 'moduleinstance_id'))
+
+        pending = {}
+        for index, (professor_id, module_code, year, semester, rating_value) in parsed.items():
+            instance_id = instances.get((module_code, year, semester))
+            if instance_id is None or professor_id not in professor_ids:
+                results[index] = {'index': index, 'success': False,
+                                  'error': 'Professor, module or module instance not found'}
+            elif (professor_id, instance_id) not in teaching:
+                results[index] = {'index': index, 'success': False,
+                                  'error': 'Professor does not teach this module instance'}
+            else:
+                # 同一批次中重复的评分以最后一条为准
+                pending[(professor_id, instance_id)] = (index, module_code, rating_value)
+
+        existing = {}
+        if pending:
+            with transaction.atomic():
+                # 与 RateView 相同：先锁定涉及的教授聚合行，再读取被替换的评分
+                lock_professor_aggregates(professor_id for professor_id, _ in pending)
+                existing = {
+                    (professor_id, instance_id): rating_value
+                    for professor_id, instance_id, rating_value in Rating.objects.filter(
+                        user=request.user,
+                        module_instance_id__in={instance_id for _, instance_id in pending},
+                    ).values_list('professor_id', 'module_instance_id', 'rating')
+                }
+
+                Rating.objects.bulk_create(
+                    [
+                        Rating(user=request.user, professor_id=professor_id, module_instance_id=instance_id,
+                               module_id=module_code, rating=rating_value)
+                        for (professor_id, instance_id), (_, module_code, rating_value) in pending.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['user', 'professor', 'module_instance'],
+                    update_fields=['rating'],
+                    batch_size=500,
+                )
+
+                apply_rating_changes(
+                    (professor_id, module_code, instance_id, existing.get((professor_id, instance_id)), rating_value)
+                    for (professor_id, instance_id), (_, module_code, rating_value) in pending.items()
+                )
+                affected = {
+                    (professor_id, module_code) for (professor_id, _), (_, module_code, _) in pending.items()
+                }
+                transaction.on_commit(lambda: invalidate_ratings(affected))
+
+        created = sum(key not in existing for key in pending)
+        applied = {index for index, _, _ in pending.values()}
+        for index in parsed:
+            if results[index] is None:
+                results[index] = {'index': index, 'success': True}
+                if index not in applied:
+                    results[index]['superseded'] = True
+
+        return Response({
+            'created': created,
+            'updated': len(pending) - created,
+            'failed': sum(not result['success'] for result in results),
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats(), status=status.HTTP_200_OK)
+
+
+class MetricsView(View):
+    """Request metrics of this process in the Prometheus text format"""
+    http_method_names = ['get', 'head', 'options']
+
+    def get(self, request):
+        if not settings.API_METRICS:
+            return JsonResponse({'error': 'Metrics are disabled'}, status=status.HTTP_404_NOT_FOUND)
+        if not metrics_access_allowed(request):
+            return JsonResponse({'error': 'Not allowed to read metrics'}, status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
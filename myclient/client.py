@@ -1,16 +1,93 @@
 #!/usr/bin/env python3
 
 import argparse
+import cmd
+import csv
 import requests
 import getpass
+import json
 import os
+import shlex
 import sys
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qs, urlencode, urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+HTTP_CACHE_FILE = ".http_cache.json"
+# Responses kept in HTTP_CACHE_FILE; the least recently stored are dropped first
+HTTP_CACHE_MAX_ENTRIES = 50
+BULK_RATE_BATCH_SIZE = 1000
+LIST_PAGE_SIZE = 500
+MAX_RETRIES = 3
+MAX_RETRY_DELAY = 60
+CONNECT_TIMEOUT = float(os.environ.get("RATING_CLIENT_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("RATING_CLIENT_READ_TIMEOUT", 30))
+# Exponential backoff between transport-level retries: 0.5s, 1s, 2s, ...
+RETRY_BACKOFF = 0.5
+# Listings are requested as column arrays (see rows_from_table); servers without it answer plain JSON
+TABLE_MEDIA_TYPE = "application/vnd.ratingservice.table+json"
+LISTING_ACCEPT = f"{TABLE_MEDIA_TYPE}, application/json;q=0.9"
+# Seconds the shell keeps the module and rating listings before downloading them again
+SHELL_CACHE_TTL = 300
+
+
+def retry_after(response):
+    """Return the Retry-After delay of a response in seconds, or None if it has none"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0), MAX_RETRY_DELAY)
+
+
+def rows_from_table(table):
+    """Turn a table listing {"count": n, "columns": {name: [...]}} back into one dict per row"""
+    columns = table["columns"]
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*(columns[name] for name in names))]
+
+
+def create_session():
+    """Return a pooled keep-alive session that retries failed connections.
+
+    Connection errors are retried for every method since the request never reached the server; read errors
+    and 502/504 answers only for GET and HEAD, which are safe to repeat. 429 and 503 are left to
+    ProfessorRatingClient.send, which honours Retry-After.
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(502, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=4)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
 
 
 class ProfessorRatingClient:
-    def __init__(self):
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
         self.token = None
         self.base_url = None
+        self.session = create_session()
+        self.timeout = (connect_timeout, read_timeout)
+        self.http_cache = None
 
     def check_base_url(self):
         """Check if base_url is set, try to load it if not"""
@@ -34,7 +111,8 @@ class ProfessorRatingClient:
 
     def require_login(self):
         """Check if user is logged in"""
-        self.load_token()
+        if not self.token:
+            self.load_token()
         if not self.token:
             print("You must login first to perform this operation.")
             return False
@@ -43,6 +121,140 @@ class ProfessorRatingClient:
             return False
         return True
 
+    def load_http_cache(self):
+        """Load cached response bodies and their ETags from local file, once per client"""
+        if self.http_cache is None:
+            self.http_cache = {}
+            if os.path.exists(HTTP_CACHE_FILE):
+                try:
+                    with open(HTTP_CACHE_FILE, "r") as f:
+                        self.http_cache = json.load(f)
+                except (OSError, ValueError):
+                    pass
+        return self.http_cache
+
+    def save_http_cache(self, cache):
+        """Save cached response bodies and their ETags to local file"""
+        try:
+            with open(HTTP_CACHE_FILE, "w") as f:
+                json.dump(cache, f)
+        except OSError:
+            pass
+
+    def send(self, method, url, **kwargs):
+        """Send a request, waiting and retrying while the server answers 429 or 503 with Retry-After"""
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(MAX_RETRIES + 1):
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code not in (429, 503) or attempt == MAX_RETRIES:
+                return response
+            delay = retry_after(response)
+            if delay is None:
+                return response
+            print(f"Server busy, retrying in {delay:.0f} seconds...")
+            time.sleep(delay)
+        return response
+
+    def request(self, method, url, **kwargs):
+        """send(), printing network errors and timeouts for the user and returning None instead of raising"""
+        try:
+            return self.send(method, url, **kwargs)
+        except requests.exceptions.Timeout:
+            print("Request timed out. Server might be overloaded or unreachable.")
+        except requests.exceptions.ConnectionError as e:
+            # Read timeouts that used up their retries surface as ConnectionError(MaxRetryError(ReadTimeoutError))
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(reason, ReadTimeoutError):
+                print("Request timed out. Server might be overloaded or unreachable.")
+            else:
+                print("Connection error. Please check your internet connection and server availability.")
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred: {e}")
+        return None
+
+    def cached_get(self, url, accept="application/json"):
+        """GET a JSON resource, sending If-None-Match and reusing the cached body on 304.
+
+        Returns (None, None) if the request failed; the error has already been printed.
+        """
+        cache = self.load_http_cache()
+        entry = cache.get(url)
+        headers = {"Accept": accept}
+        if entry and entry.get("accept", "application/json") == accept:
+            headers["If-None-Match"] = entry["etag"]
+        else:
+            entry = None
+
+        response = self.request("GET", url, headers=headers)
+        if response is None:
+            return None, None
+        if response.status_code == 304 and entry:
+            return 200, entry["body"]
+        if response.status_code != 200:
+            return response.status_code, None
+
+        body = response.json()
+        etag = response.headers.get("ETag")
+        # Only URLs without a cursor are kept: cursors change with the data, so later pages would pile up
+        if etag and "cursor" not in parse_qs(urlsplit(url).query):
+            cache.pop(url, None)
+            cache[url] = {"etag": etag, "body": body, "accept": accept}
+            for stale in list(cache)[:-HTTP_CACHE_MAX_ENTRIES]:
+                del cache[stale]
+            self.save_http_cache(cache)
+        return 200, body
+
+    def get_pages(self, path):
+        """Yield (status_code, items) for each page of a paginated listing, following next_cursor.
+
+        Iteration stops after the first page that does not answer 200, which is yielded with items None
+        (and status_code None if the request itself failed).
+        """
+        cursor = None
+        while True:
+            url = f"{self.base_url}{path}?limit={LIST_PAGE_SIZE}"
+            if cursor:
+                url += f"&cursor={cursor}"
+            status_code, page = self.cached_get(url, accept=LISTING_ACCEPT)
+            if status_code != 200:
+                yield status_code, None
+                return
+            results = page["results"]
+            yield status_code, rows_from_table(results) if isinstance(results, dict) else results
+            cursor = page["next_cursor"]
+            if not cursor:
+                return
+
+    def fetch_all(self, path, what):
+        """Return every item of a paginated listing, or None after printing why it failed"""
+        items = []
+        for status_code, page in self.get_pages(path):
+            if status_code is None:
+                return None
+            if status_code != 200:
+                print(f"Failed to retrieve {what}: {status_code}")
+                if status_code == 401:
+                    print("You may need to login first.")
+                return None
+            items.extend(page)
+        return items
+
+    @staticmethod
+    def print_module(module):
+        print(f"Code: {module['code']}")
+        print(f"Name: {module['name']}")
+        print(f"Year: {module['year']}")
+        print(f"Semester: {module['semester']}")
+        professors = module['professors']
+        professor_str = ", ".join([f"{p['id']}, {p['name']}" for p in professors])
+        print(f"Taught by: {professor_str}")
+        print("-" * 70)
+
+    @staticmethod
+    def print_rating(prof):
+        stars = "*" * prof['rating']
+        print(f"The rating of Professor {prof['name']} ({prof['id']}) is {stars}")
+
     def register(self):
         """Register a new user"""
         if not self.check_base_url():
@@ -53,22 +265,18 @@ class ProfessorRatingClient:
         email = input("Enter email: ")
         password = getpass.getpass("Enter password: ")
 
-        try:
-            response = requests.post(
-                f"{self.base_url}/api/register/",
-                json={"username": username, "email": email, "password": password}
-            )
+        response = self.request(
+            "POST",
+            f"{self.base_url}/api/register/",
+            json={"username": username, "email": email, "password": password}
+        )
+        if response is None:
+            return
 
-            if response.status_code == 201:
-                print("Registration successful!")
-            else:
-                print(f"Registration failed: {response.json()}")
-        except requests.exceptions.ConnectionError:
-            print("Connection error. Please check your internet connection and server availability.")
-        except requests.exceptions.Timeout:
-            print("Request timed out. Server might be overloaded or unreachable.")
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
+        if response.status_code == 201:
+            print("Registration successful!")
+        else:
+            print(f"Registration failed: {response.json()}")
 
     def login(self, url):
         """Login to the service"""
@@ -81,28 +289,24 @@ class ProfessorRatingClient:
         username = input("Enter username: ")
         password = getpass.getpass("Enter password: ")
 
-        try:
-            response = requests.post(
-                f"{self.base_url}/api/login/",
-                json={"username": username, "password": password}
-            )
+        response = self.request(
+            "POST",
+            f"{self.base_url}/api/login/",
+            json={"username": username, "password": password}
+        )
+        if response is None:
+            return
 
-            if response.status_code == 200:
-                self.token = response.json()['token']
-                # Save token and base_url to local files
-                with open(".token", "w") as f:
-                    f.write(self.token)
-                with open(".base_url", "w") as f:
-                    f.write(self.base_url)
-                print("Login successful!")
-            else:
-                print("Login failed. Please check your username and password.")
-        except requests.exceptions.ConnectionError:
-            print("Connection error. Please check your internet connection and server availability.")
-        except requests.exceptions.Timeout:
-            print("Request timed out. Server might be overloaded or unreachable.")
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
+        if response.status_code == 200:
+            self.token = response.json()['token']
+            # Save token and base_url to local files
+            with open(".token", "w") as f:
+                f.write(self.token)
+            with open(".base_url", "w") as f:
+                f.write(self.base_url)
+            print("Login successful!")
+        else:
+            print("Login failed. Please check your username and password.")
 
     def logout(self):
         """Logout from the service"""
@@ -126,107 +330,122 @@ class ProfessorRatingClient:
         if not self.check_base_url():
             return
 
-        try:
-            response = requests.get(f"{self.base_url}/api/modules/")
-            if response.status_code == 200:
-                modules = response.json()
-                if not modules:
-                    print("No module instances found.")
-                    return
-                for module in modules:
-                    print(f"Code: {module['code']}")
-                    print(f"Name: {module['name']}")
-                    print(f"Year: {module['year']}")
-                    print(f"Semester: {module['semester']}")
-                    professors = module['professors']
-                    professor_str = ", ".join([f"{p['id']}, {p['name']}" for p in professors])
-                    print(f"Taught by: {professor_str}")
-                    print("-" * 70)
-            else:
-                print(f"Failed to retrieve module list: {response.status_code}")
-                if response.status_code == 401:
+        found = False
+        for status_code, modules in self.get_pages("/api/modules/"):
+            if status_code is None:
+                return
+            if status_code != 200:
+                print(f"Failed to retrieve module list: {status_code}")
+                if status_code == 401:
                     print("You may need to login first.")
-        except requests.exceptions.ConnectionError:
-            print("Connection error. Please check your internet connection and server availability.")
-        except requests.exceptions.Timeout:
-            print("Request timed out. Server might be overloaded or unreachable.")
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
+                return
+            for module in modules:
+                found = True
+                self.print_module(module)
+        if not found:
+            print("No module instances found.")
 
     def view_ratings(self):
         """View all professor ratings"""
         if not self.check_base_url():
             return
 
-        try:
-            response = requests.get(f"{self.base_url}/api/professors/ratings/")
-            if response.status_code == 200:
-                ratings = response.json()
-                if not ratings:
-                    print("No professor ratings found.")
-                    return
-                for prof in ratings:
-                    stars = "*" * prof['rating']
-                    print(f"The rating of Professor {prof['name']} ({prof['id']}) is {stars}")
-            else:
-                print(f"Failed to retrieve ratings: {response.status_code}")
-                if response.status_code == 401:
+        found = False
+        for status_code, ratings in self.get_pages("/api/professors/ratings/"):
+            if status_code is None:
+                return
+            if status_code != 200:
+                print(f"Failed to retrieve ratings: {status_code}")
+                if status_code == 401:
                     print("You may need to login first.")
-        except requests.exceptions.ConnectionError:
-            print("Connection error. Please check your internet connection and server availability.")
-        except requests.exceptions.Timeout:
-            print("Request timed out. Server might be overloaded or unreachable.")
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
+                return
+            for prof in ratings:
+                found = True
+                self.print_rating(prof)
+        if not found:
+            print("No professor ratings found.")
 
     def view_average(self, professor_id, module_code):
         """View average rating of a professor in a module"""
         if not self.check_base_url():
             return
 
-        try:
-            response = requests.get(f"{self.base_url}/api/professors/{professor_id}/modules/{module_code}/rating/")
-            if response.status_code == 200:
-                rating = response.json()['rating']
-                stars = "*" * rating
-                print(f"The rating of Professor {professor_id} in module {module_code} is {stars}")
-            elif response.status_code == 404:
+        response = self.request("GET", f"{self.base_url}/api/professors/{professor_id}/modules/{module_code}/rating/")
+        if response is None:
+            return
+
+        if response.status_code == 200:
+            result = response.json()
+            count = result.get('count')
+            if count == 0:
                 print(f"No ratings found for Professor {professor_id} in module {module_code}.")
-            else:
-                print(f"Failed to retrieve average rating: {response.status_code}")
-                if response.status_code == 401:
-                    print("You may need to login first.")
-        except requests.exceptions.ConnectionError:
-            print("Connection error. Please check your internet connection and server availability.")
-        except requests.exceptions.Timeout:
-            print("Request timed out. Server might be overloaded or unreachable.")
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
+                return
+            stars = "*" * result['rating']
+            print(f"The rating of Professor {professor_id} in module {module_code} is {stars}"
+                  + (f" ({count} rating{'s' if count != 1 else ''})" if count else ""))
+        elif response.status_code == 404:
+            print(f"Professor {professor_id} or module {module_code} not found.")
+        else:
+            print(f"Failed to retrieve average rating: {response.status_code}")
+            if response.status_code == 401:
+                print("You may need to login first.")
 
-    def verify_module_instance(self, professor_id, module_code, year, semester):
-        """Verify if a module instance with given professor, year and semester exists"""
-        try:
-            response = requests.get(f"{self.base_url}/api/modules/")
-            if response.status_code == 200:
-                modules = response.json()
-                # Check if there's a matching module instance
-                for module in modules:
-                    if module['code'] == module_code:
-                        if str(module['year']) == str(year) and str(module['semester']) == str(semester):
-                            for prof in module['professors']:
-                                if prof['id'] == professor_id:
-                                    return True
-                print(f"Error: No module instance found for Professor {professor_id} teaching {module_code} in year {year}, semester {semester}.")
-                return False
-            else:
-                print(f"Failed to verify module instance: {response.status_code}")
-                return False
-        except requests.exceptions.RequestException:
-            print("Connection error while verifying module instance.")
-            return False
+    def view_top(self, limit=None, year=None, semester=None, module_code=None, min_count=None):
+        """View the highest rated professors, optionally only counting ratings of some module instances"""
+        if not self.check_base_url():
+            return
+
+        params = {"limit": limit, "year": year, "semester": semester, "module": module_code, "min_count": min_count}
+        query = urlencode({name: value for name, value in params.items() if value is not None})
+        status_code, ranking = self.cached_get(f"{self.base_url}/api/professors/top/" + (f"?{query}" if query else ""))
+        if status_code is None:
+            return
+        if status_code != 200:
+            print(f"Failed to retrieve top professors: {status_code}")
+            if status_code == 400:
+                print("Check the limit, year, semester and minimum count values.")
+            elif status_code == 401:
+                print("You may need to login first.")
+            return
+        if not ranking:
+            print("No rated professors match.")
+            return
+        for row in ranking:
+            print(f"{row['rank']:>3}. {row['name']} ({row['id']}): {row['average']:.2f} "
+                  f"from {row['count']} rating{'s' if row['count'] != 1 else ''}")
+
+    def view_histogram(self, professor_id, year=None, semester=None, module_code=None):
+        """View how many 1 to 5 star ratings a professor has, optionally only in some module instances"""
+        if not self.check_base_url():
+            return
+
+        params = {"year": year, "semester": semester, "module": module_code}
+        query = urlencode({name: value for name, value in params.items() if value is not None})
+        url = f"{self.base_url}/api/professors/{professor_id}/histogram/" + (f"?{query}" if query else "")
+        status_code, result = self.cached_get(url)
+        if status_code is None:
+            return
+        if status_code == 404:
+            print(f"Professor {professor_id} not found.")
+            return
+        if status_code != 200:
+            print(f"Failed to retrieve rating histogram: {status_code}")
+            if status_code == 401:
+                print("You may need to login first.")
+            return
+        if not result["count"]:
+            print(f"No ratings found for Professor {result['name']} ({result['id']}).")
+            return
+        print(f"Ratings of Professor {result['name']} ({result['id']}): {result['count']}, "
+              f"average {result['average']:.2f}")
+        largest = max(result["histogram"].values())
+        for stars in range(5, 0, -1):
+            count = result["histogram"][str(stars)]
+            bar = "#" * round(40 * count / largest) if largest else ""
+            print(f"{stars} {'*' * stars:<5} {count:>7}  {bar}")
 
     def rate_professor(self, professor_id, module_code, year, semester, rating):
-        """Rate a professor in a specific module instance"""
+        """Rate a professor in a specific module instance; returns True if the rating was stored"""
         # Check base_url first
         if not self.check_base_url():
             return
@@ -245,8 +464,12 @@ class ProfessorRatingClient:
             print("Rating must be a number between 1 and 5.")
             return
 
-        # Verify module instance exists
-        if not self.verify_module_instance(professor_id, module_code, year, semester):
+        # Validate year and semester; the module instance itself is checked by the server
+        try:
+            int(year)
+            int(semester)
+        except ValueError:
+            print("Year and semester must be numbers.")
             return
 
         headers = {"Authorization": f"Token {self.token}"}
@@ -258,35 +481,352 @@ class ProfessorRatingClient:
             "rating": int(rating)
         }
 
+        response = self.request(
+            "POST",
+            f"{self.base_url}/api/rate/",
+            json=data,
+            headers=headers
+        )
+        if response is None:
+            return
+
+        if response.status_code == 200:
+            print("Rating submitted successfully!")
+            return True
+        elif response.status_code == 401:
+            print("Authentication failed. Please login again.")
+            # Optionally clear the token to force re-login
+            self.token = None
+            if os.path.exists(".token"):
+                os.remove(".token")
+        elif response.status_code in (400, 404):
+            # The server checks that the professor teaches this module instance
+            print(f"Error: {response.json()['error']} (Professor {professor_id}, {module_code}, "
+                  f"year {year}, semester {semester}).")
+        else:
+            print(f"Failed to submit rating: {response.json()}")
+
+    def rate_bulk(self, path):
+        """Submit ratings from a CSV file with professor_id,module_code,year,semester,rating columns.
+
+        Returns True if any rating was stored.
+        """
+        if not self.check_base_url():
+            return
+
+        if not self.require_login():
+            return
+
         try:
-            response = requests.post(
-                f"{self.base_url}/api/rate/",
-                json=data,
+            with open(path, newline="") as f:
+                rows = list(csv.DictReader(f))
+        except OSError as e:
+            print(f"Could not read {path}: {e}")
+            return
+
+        if not rows:
+            print("No ratings found in file.")
+            return
+
+        headers = {"Authorization": f"Token {self.token}"}
+        created = updated = failed = 0
+
+        for start in range(0, len(rows), BULK_RATE_BATCH_SIZE):
+            batch = rows[start:start + BULK_RATE_BATCH_SIZE]
+            response = self.request(
+                "POST",
+                f"{self.base_url}/api/rate/bulk/",
+                json={"ratings": batch},
                 headers=headers
             )
+            if response is None:
+                return
 
-            if response.status_code == 200:
-                print("Rating submitted successfully!")
-            elif response.status_code == 401:
+            if response.status_code == 401:
                 print("Authentication failed. Please login again.")
-                # Optionally clear the token to force re-login
-                self.token = None
-                if os.path.exists(".token"):
-                    os.remove(".token")
-            else:
-                print(f"Failed to submit rating: {response.json()}")
-        except requests.exceptions.ConnectionError:
-            print("Connection error. Please check your internet connection and server availability.")
-        except requests.exceptions.Timeout:
-            print("Request timed out. Server might be overloaded or unreachable.")
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
+                return
+            if response.status_code != 200:
+                print(f"Failed to submit ratings: {response.json()}")
+                return
 
+            summary = response.json()
+            created += summary["created"]
+            updated += summary["updated"]
+            failed += summary["failed"]
+            for result in summary["results"]:
+                if not result["success"]:
+                    # CSV line numbers start at 2 because of the header row
+                    print(f"Line {start + result['index'] + 2}: {result['error']}")
 
-def main():
-    client = ProfessorRatingClient()
+        print(f"Bulk rating complete: {created} created, {updated} updated, {failed} failed.")
+        return created + updated > 0
+
+
+class CatalogueCache:
+    """In-memory copy of the module and professor rating listings, kept for SHELL_CACHE_TTL seconds"""
+
+    MODULES = "/api/modules/"
+    RATINGS = "/api/professors/ratings/"
+
+    def __init__(self, client, ttl=SHELL_CACHE_TTL):
+        self.client = client
+        self.ttl = ttl
+        self.entries = {}
+
+    def get(self, path, what):
+        entry = self.entries.get(path)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        items = self.client.fetch_all(path, what)
+        if items is not None:
+            self.entries[path] = (time.monotonic(), items)
+        return items
+
+    def modules(self):
+        return self.get(self.MODULES, "module list")
+
+    def ratings(self):
+        return self.get(self.RATINGS, "ratings")
+
+    def invalidate(self, path=None):
+        if path is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(path, None)
+
+    def cached(self, path):
+        entry = self.entries.get(path)
+        return entry[1] if entry else []
+
+    def professor_ids(self):
+        ids = {prof["id"] for prof in self.cached(self.RATINGS)}
+        ids.update(p["id"] for module in self.cached(self.MODULES) for p in module["professors"])
+        return sorted(ids)
+
+    def module_codes(self):
+        return sorted({module["code"] for module in self.cached(self.MODULES)})
+
+    def instances(self, module_code):
+        return [module for module in self.cached(self.MODULES) if module["code"] == module_code]
 
+
+def add_top_arguments(parser):
+    parser.add_argument("--limit", type=int, help="Number of professors to show (default 10, at most 100)")
+    parser.add_argument("--year", type=int, help="Only count ratings of module instances in this year")
+    parser.add_argument("--semester", type=int, help="Only count ratings of module instances in this semester")
+    parser.add_argument("--module", dest="module_code", help="Only count ratings of this module")
+    parser.add_argument("--min-count", type=int, help="Leave out professors with fewer ratings (default 1)")
+
+
+def run_top(client, args):
+    client.view_top(args.limit, args.year, args.semester, args.module_code, args.min_count)
+
+
+def add_histogram_arguments(parser):
+    parser.add_argument("professor_id", help="Professor ID")
+    parser.add_argument("--year", type=int, help="Only count ratings of module instances in this year")
+    parser.add_argument("--semester", type=int, help="Only count ratings of module instances in this semester")
+    parser.add_argument("--module", dest="module_code", help="Only count ratings of this module")
+
+
+def run_histogram(client, args):
+    client.view_histogram(args.professor_id, args.year, args.semester, args.module_code)
+
+
+class ClientShell(cmd.Cmd):
+    """Interactive session: one connection pool, credentials read once and listings cached in memory.
+
+    Commands can also be piped in, one per line, e.g. python client.py shell < commands.txt
+    """
+
+    intro = "Professor Rating shell. Type help or ? to list commands, quit to exit."
+    prompt = "rating> "
+
+    def __init__(self, client, stdin=None):
+        interactive = stdin is None and sys.stdin.isatty()
+        super().__init__(stdin=stdin)
+        self.client = client
+        self.catalogue = CatalogueCache(client)
+        if not interactive:
+            self.use_rawinput = False
+            self.intro = None
+            self.prompt = ""
+
+    def preloop(self):
+        self.client.load_token()
+
+    def precmd(self, line):
+        line = line.strip()
+        if line.startswith("#"):
+            return ""
+        # "rate-bulk" is not a valid method name
+        if line.startswith("rate-bulk"):
+            line = "rate_bulk" + line[len("rate-bulk"):]
+        return line
+
+    def emptyline(self):
+        return False
+
+    def default(self, line):
+        print(f"Unknown command: {line.split()[0]}. Type help to list commands.")
+
+    @staticmethod
+    def parse(arg, names):
+        try:
+            args = shlex.split(arg)
+        except ValueError as e:
+            print(f"Invalid arguments: {e}")
+            return None
+        if len(args) != len(names):
+            print(f"Expected {len(names)} argument(s): {' '.join(names)}")
+            return None
+        return args
+
+    @staticmethod
+    def parse_options(arg, command, add_arguments):
+        """Parse arg with the command line options of a one-shot command; None after printing the error"""
+        parser = argparse.ArgumentParser(prog=command, add_help=False)
+        add_arguments(parser)
+        try:
+            return parser.parse_args(shlex.split(arg))
+        except ValueError as e:
+            print(f"Invalid arguments: {e}")
+        except SystemExit:
+            # argparse has already printed the usage and the error
+            pass
+        return None
+
+    def complete_args(self, line, begidx, text, choices_for):
+        """Complete the positional argument under the cursor; choices_for[i] returns candidates for argument i"""
+        position = len(line[:begidx].split()) - 1
+        if position < 0 or position >= len(choices_for):
+            return []
+        if not self.catalogue.cached(CatalogueCache.MODULES) and self.client.check_base_url():
+            self.catalogue.modules()
+        return [choice for choice in choices_for[position](line.split()) if choice.startswith(text)]
+
+    def do_list(self, arg):
+        """list: show all module instances (from the cache if it is fresh)"""
+        if not self.client.check_base_url():
+            return
+        modules = self.catalogue.modules()
+        if modules is None:
+            return
+        for module in modules:
+            self.client.print_module(module)
+        if not modules:
+            print("No module instances found.")
+
+    def do_view(self, arg):
+        """view: show the ratings of all professors (from the cache if it is fresh)"""
+        if not self.client.check_base_url():
+            return
+        ratings = self.catalogue.ratings()
+        if ratings is None:
+            return
+        for prof in ratings:
+            self.client.print_rating(prof)
+        if not ratings:
+            print("No professor ratings found.")
+
+    def do_average(self, arg):
+        """average PROFESSOR_ID MODULE_CODE: show the average rating of a professor in a module"""
+        args = self.parse(arg, ["PROFESSOR_ID", "MODULE_CODE"])
+        if args:
+            self.client.view_average(*args)
+
+    def complete_average(self, text, line, begidx, endidx):
+        return self.complete_args(line, begidx, text, [
+            lambda words: self.catalogue.professor_ids(),
+            lambda words: self.catalogue.module_codes(),
+        ])
+
+    def do_top(self, arg):
+        """top [--limit N] [--year YEAR] [--semester N] [--module CODE] [--min-count N]: highest rated professors"""
+        args = self.parse_options(arg, "top", add_top_arguments)
+        if args:
+            run_top(self.client, args)
+
+    def do_histogram(self, arg):
+        """histogram PROFESSOR_ID [--year YEAR] [--semester SEMESTER] [--module CODE]: star counts of a professor"""
+        args = self.parse_options(arg, "histogram", add_histogram_arguments)
+        if args:
+            run_histogram(self.client, args)
+
+    def complete_histogram(self, text, line, begidx, endidx):
+        return self.complete_args(line, begidx, text, [lambda words: self.catalogue.professor_ids()])
+
+    def do_rate(self, arg):
+        """rate PROFESSOR_ID MODULE_CODE YEAR SEMESTER RATING: rate a professor (1-5) in a module instance"""
+        args = self.parse(arg, ["PROFESSOR_ID", "MODULE_CODE", "YEAR", "SEMESTER", "RATING"])
+        if args and self.client.rate_professor(*args):
+            self.catalogue.invalidate(CatalogueCache.RATINGS)
+
+    def complete_rate(self, text, line, begidx, endidx):
+        def instances(words):
+            return self.catalogue.instances(words[2]) if len(words) > 2 else []
+        return self.complete_args(line, begidx, text, [
+            lambda words: self.catalogue.professor_ids(),
+            lambda words: self.catalogue.module_codes(),
+            lambda words: sorted({str(module["year"]) for module in instances(words)}),
+            lambda words: sorted({str(module["semester"]) for module in instances(words)}),
+            lambda words: ["1", "2", "3", "4", "5"],
+        ])
+
+    def do_rate_bulk(self, arg):
+        """rate-bulk FILE.csv: submit ratings from a CSV file"""
+        args = self.parse(arg, ["FILE"])
+        if args and self.client.rate_bulk(args[0]):
+            self.catalogue.invalidate(CatalogueCache.RATINGS)
+
+    def do_refresh(self, arg):
+        """refresh: drop the cached listings and download them again"""
+        self.catalogue.invalidate()
+        if self.client.check_base_url() and self.catalogue.modules() is not None \
+                and self.catalogue.ratings() is not None:
+            print(f"Cached {len(self.catalogue.cached(CatalogueCache.MODULES))} module instances and "
+                  f"{len(self.catalogue.cached(CatalogueCache.RATINGS))} professor ratings.")
+
+    def do_ttl(self, arg):
+        """ttl [SECONDS]: show or set how long listings are cached"""
+        if arg.strip():
+            try:
+                self.catalogue.ttl = max(float(arg), 0)
+            except ValueError:
+                print("TTL must be a number of seconds.")
+                return
+        print(f"Listings are cached for {self.catalogue.ttl:g} seconds.")
+
+    def do_login(self, arg):
+        """login URL: log in to the service"""
+        args = self.parse(arg, ["URL"])
+        if args:
+            self.client.login(args[0])
+            self.catalogue.invalidate()
+
+    def do_logout(self, arg):
+        """logout: remove the locally stored credentials"""
+        self.client.logout()
+        self.catalogue.invalidate()
+
+    def do_quit(self, arg):
+        """quit: leave the shell"""
+        return True
+
+    do_exit = do_quit
+
+    def do_EOF(self, arg):
+        if self.use_rawinput:
+            print()
+        return True
+
+
+def main():
     parser = argparse.ArgumentParser(description="Professor Rating Client")
+    parser.add_argument("--connect-timeout", type=float, default=CONNECT_TIMEOUT,
+                        help=f"Seconds to wait for a connection (default {CONNECT_TIMEOUT:g})")
+    parser.add_argument("--read-timeout", type=float, default=READ_TIMEOUT,
+                        help=f"Seconds to wait for the server to answer (default {READ_TIMEOUT:g})")
     subparsers = parser.add_subparsers(dest="command", help="Commands")
 
     # Register
@@ -310,6 +850,14 @@ def main():
     average_parser.add_argument("professor_id", help="Professor ID")
     average_parser.add_argument("module_code", help="Module code")
 
+    # Top
+    add_top_arguments(subparsers.add_parser("top", help="View the highest rated professors"))
+
+    # Histogram
+    add_histogram_arguments(
+        subparsers.add_parser("histogram", help="View the star distribution of a professor's ratings")
+    )
+
     # Rate
     rate_parser = subparsers.add_parser("rate", help="Rate a professor")
     rate_parser.add_argument("professor_id", help="Professor ID")
@@ -318,7 +866,15 @@ def main():
     rate_parser.add_argument("semester", help="Semester number")
     rate_parser.add_argument("rating", help="Rating (1-5)")
 
+    # Shell
+    subparsers.add_parser("shell", help="Interactive session; also reads commands piped from stdin")
+
+    # Bulk rate
+    rate_bulk_parser = subparsers.add_parser("rate-bulk", help="Submit ratings from a CSV file")
+    rate_bulk_parser.add_argument("file", help="CSV file with professor_id,module_code,year,semester,rating columns")
+
     args = parser.parse_args()
+    client = ProfessorRatingClient(args.connect_timeout, args.read_timeout)
 
     if args.command == "register":
         client.register()
@@ -338,9 +894,21 @@ def main():
     elif args.command == "average":
         client.view_average(args.professor_id, args.module_code)
 
+    elif args.command == "top":
+        run_top(client, args)
+
+    elif args.command == "histogram":
+        run_histogram(client, args)
+
     elif args.command == "rate":
         client.rate_professor(args.professor_id, args.module_code, args.year, args.semester, args.rating)
 
+    elif args.command == "rate-bulk":
+        client.rate_bulk(args.file)
+
+    elif args.command == "shell":
+        ClientShell(client).cmdloop()
+
     else:
         parser.print_help()
 
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""Run the api test suite against every supported database backend.
+
+SQLite always runs. PostgreSQL runs against TEST_DATABASE_URL when it is set; otherwise a throwaway
+cluster is started with initdb/pg_ctl if they are on PATH. It is skipped when neither is available
+or when no PostgreSQL driver is installed.
+"""
+
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+def run_suite(label, database_url, extra_args):
+    env = dict(os.environ)
+    env.pop('DATABASE_URL', None)
+    if database_url:
+        env['DATABASE_URL'] = database_url
+    print(f"== {label} ==", flush=True)
+    return subprocess.call([sys.executable, 'manage.py', 'test', 'api', *extra_args], cwd=BASE_DIR, env=env)
+
+
+def postgres_driver_installed():
+    return any(importlib.util.find_spec(name) for name in ('psycopg', 'psycopg2'))
+
+
+def run_postgres_cluster(extra_args):
+    """Start a temporary PostgreSQL cluster on a unix socket, run the suite and tear it down"""
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, 'data')
+        subprocess.check_call(['initdb', '-D', data_dir, '-U', 'postgres', '-A', 'trust'],
+                              stdout=subprocess.DEVNULL)
+        subprocess.check_call(['pg_ctl', '-D', data_dir, '-w', '-l', os.path.join(tmp, 'log'),
+                               '-o', f"-k {tmp} -c listen_addresses=''", 'start'],
+                              stdout=subprocess.DEVNULL)
+        try:
+            return run_suite('postgresql (temporary cluster)',
+                             f"postgres://postgres@/postgres?host={tmp}", extra_args)
+        finally:
+            subprocess.call(['pg_ctl', '-D', data_dir, '-m', 'fast', 'stop'], stdout=subprocess.DEVNULL)
+
+
+def main(extra_args):
+    failures = 0
+    failures += run_suite('sqlite', None, extra_args) != 0
+
+    if not postgres_driver_installed():
+        print("== postgresql: skipped (install psycopg to enable) ==")
+    elif os.environ.get('TEST_DATABASE_URL'):
+        failures += run_suite('postgresql', os.environ['TEST_DATABASE_URL'], extra_args) != 0
+    elif shutil.which('initdb') and shutil.which('pg_ctl'):
+        failures += run_postgres_cluster(extra_args) != 0
+    else:
+        print("== postgresql: skipped (set TEST_DATABASE_URL or put initdb/pg_ctl on PATH) ==")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))